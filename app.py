@@ -1,24 +1,88 @@
 import os
 import io
+import re
+import csv
+import json
+import unicodedata
+import html
+import html.entities
+import time
+_INICIO_IMPORTACAO = time.perf_counter()  # referência para o relatório de inicialização
+import uuid
+import hashlib
+import hmac
+import collections
+import types
+import copy
+import dataclasses
+import functools
+import itertools
+import concurrent.futures
+import threading
 import zipfile
-from flask import Flask, render_template, request, send_file, flash, make_response
-from bs4 import BeautifulSoup, NavigableString
+import math
+import sqlite3
+import logging
+import contextlib
+import cProfile
+from flask import Flask, Response, render_template, request, send_file, flash, make_response, jsonify, url_for, g
+from html.parser import HTMLParser
+from PIL import Image
 
 # --- Imports do ReportLab ---
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import cm, mm
 from reportlab.lib.utils import ImageReader
 from reportlab.pdfgen import canvas
-from reportlab.platypus import Paragraph, SimpleDocTemplate
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Frame
+from reportlab.platypus.doctemplate import LayoutError
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT
 from reportlab.lib.colors import black, blue
+from reportlab.pdfbase import pdfmetrics, pdfdoc
 
 # --- Inicialização do Flask ---
 app = Flask(__name__)
 app.secret_key = 'sua-chave-secreta-muito-segura'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0  # Disable caching
+app.config['RENDER_EXECUTOR'] = os.environ.get('RENDER_EXECUTOR', 'serial')  # 'serial', 'thread' ou 'process'
+MODOS_RENDERIZACAO = ('serial', 'thread', 'process')
+if app.config['RENDER_EXECUTOR'] not in MODOS_RENDERIZACAO:
+    raise ValueError(f"RENDER_EXECUTOR inválido: {app.config['RENDER_EXECUTOR']!r} (use {', '.join(MODOS_RENDERIZACAO)})")
+app.config['RENDER_MAX_WORKERS'] = int(os.environ.get('RENDER_MAX_WORKERS', '4'))
+app.config['RENDER_TIMEOUT'] = float(os.environ.get('RENDER_TIMEOUT', '30'))  # segundos por documento
+app.config['ZIP_COMPRESSAO'] = {'.pdf': zipfile.ZIP_STORED}  # por extensão; demais entradas usam DEFLATE
+app.config['LOTE_MAX_REGISTROS'] = int(os.environ.get('LOTE_MAX_REGISTROS', '500'))
+app.config['TRABALHOS_MAX_WORKERS'] = int(os.environ.get('TRABALHOS_MAX_WORKERS', '2'))
+app.config['TRABALHOS_MAX_ATIVOS'] = int(os.environ.get('TRABALHOS_MAX_ATIVOS', '100'))
+app.config['TRABALHOS_TTL'] = float(os.environ.get('TRABALHOS_TTL', '600'))  # segundos, após a conclusão, até o resultado expirar
+app.config['TRABALHOS_DIR'] = os.environ.get('TRABALHOS_DIR', os.path.join(app.instance_path, 'trabalhos'))  # estado e resultados, compartilhados entre workers
+app.config['CACHE_SAIDA_MAX_BYTES'] = int(os.environ.get('CACHE_SAIDA_MAX_BYTES', str(64 * 1024 * 1024)))  # 0 desativa a memória
+app.config['CACHE_SAIDA_DIR'] = os.environ.get('CACHE_SAIDA_DIR')  # camada em disco compartilhada entre workers (opcional)
+app.config['CACHE_SAIDA_DISCO_MAX_BYTES'] = int(os.environ.get('CACHE_SAIDA_DISCO_MAX_BYTES', str(1024 * 1024 * 1024)))  # poda por acesso mais antigo; 0 = sem limite
+app.config['PERFIL_LIMIAR'] = float(os.environ['PERFIL_LIMIAR']) if os.environ.get('PERFIL_LIMIAR') else None  # segundos; None desativa
+app.config['PERFIL_FERRAMENTA'] = os.environ.get('PERFIL_FERRAMENTA', 'cprofile')  # 'cprofile' ou 'pyinstrument'
+app.config['PERFIL_DIR'] = os.environ.get('PERFIL_DIR', 'perfis')
+app.config['ACERVO_DB'] = os.environ.get('ACERVO_DB', '')  # registros validados (ex.: instance/acervo.sqlite3); vazio desativa
+app.config['ACERVO_TOKEN'] = os.environ.get('ACERVO_TOKEN', '')  # Bearer exigido pelas rotas /acervo; vazio as bloqueia
+app.config['PERFIL_SAIDA'] = os.environ.get('PERFIL_SAIDA', 'arquivo')  # perfil de otimização padrão dos PDFs (PERFIS_SAIDA)
+app.config['ADMISSAO_MAX_RENDERS'] = int(os.environ.get('ADMISSAO_MAX_RENDERS', '4'))  # gerações simultâneas por processo; 0 desativa
+app.config['ADMISSAO_MAX_FILA'] = int(os.environ.get('ADMISSAO_MAX_FILA', '16'))  # pedidos aguardando vaga; acima disso, 503
+app.config['ADMISSAO_ESPERA_MAX'] = float(os.environ.get('ADMISSAO_ESPERA_MAX', '10'))  # segundos na fila antes de desistir (503)
+app.config['ADMISSAO_RETRY_AFTER'] = int(os.environ.get('ADMISSAO_RETRY_AFTER', '5'))
+# Atrás de proxy reverso, defina LIMITE_CONFIAR_PROXY: senão todos os clientes chegam com o IP do proxy e dividem um só balde
+app.config['LIMITE_TAXA'] = float(os.environ.get('LIMITE_TAXA', '0.5'))  # fichas por segundo por IP; 0 desativa
+app.config['LIMITE_RAJADA'] = float(os.environ.get('LIMITE_RAJADA', '10'))  # capacidade do balde (rajada máxima)
+app.config['LIMITE_SQLITE'] = os.environ.get('LIMITE_SQLITE')  # arquivo SQLite para compartilhar os baldes entre workers (opcional)
+app.config['LIMITE_CONFIAR_PROXY'] = int(os.environ.get('LIMITE_CONFIAR_PROXY', '0'))  # proxies próprios à frente do app (entradas confiáveis no fim do X-Forwarded-For)
+app.config['ASGI_MAX_THREADS'] = int(os.environ.get('ASGI_MAX_THREADS', '8'))  # threads que executam o app no modo ASGI (asgi.py)
+app.config['LAYOUT_MAX_ITENS'] = int(os.environ.get('LAYOUT_MAX_ITENS', '512'))  # parágrafos fixos já quebrados em linhas
+app.config['PREVIA_TTL'] = float(os.environ.get('PREVIA_TTL', '120'))  # segundos que uma prévia fica em cache
+app.config['PREVIA_MAX_ITENS'] = int(os.environ.get('PREVIA_MAX_ITENS', '256'))
+app.config['PREVIA_DPI'] = int(os.environ.get('PREVIA_DPI', '60'))  # resolução padrão do PNG (limitada a PREVIA_DPI_MAX)
+app.config['PREVIA_LIMITE_TAXA'] = float(os.environ.get('PREVIA_LIMITE_TAXA', '2'))  # balde próprio das prévias, por IP; 0 desativa
+app.config['PREVIA_LIMITE_RAJADA'] = float(os.environ.get('PREVIA_LIMITE_RAJADA', '20'))
 
 @app.after_request
 def after_request(response):
@@ -30,7 +94,6 @@ def after_request(response):
         if response.mimetype in ['application/zip', 'application/pdf']:
             response.headers['Content-Description'] = 'File Transfer'
             response.headers['Content-Transfer-Encoding'] = 'binary'
-            response.headers['Connection'] = 'Keep-Alive'
     
     # Add security headers
     response.headers['X-Content-Type-Options'] = 'nosniff'
@@ -38,11 +101,162 @@ def after_request(response):
     response.headers['Pragma'] = 'no-cache'
     response.headers['Expires'] = '0'
     
-    # Log response headers for debugging
-    app.logger.debug(f"Response headers: {dict(response.headers)}")
+    # Log response headers for debugging (só monta o dicionário se o nível DEBUG estiver ativo)
+    if app.logger.isEnabledFor(logging.DEBUG):
+        app.logger.debug(f"Response headers: {dict(response.headers)}")
+    
+    # Tempo total e perfil são fechados só quando o corpo termina de ser enviado (inclui ZIP em fluxo)
+    if 'inicio_requisicao' in g:
+        response.call_on_close(functools.partial(finalizar_medicao, request.endpoint or 'desconhecido', request.method, response.status_code, g.inicio_requisicao, g.pop('perfil', None)))
+    # Com direct_passthrough (send_file) o Werkzeug devolve o iterável cru e os call_on_close (medição, vaga de admissão) não rodariam
+    response.direct_passthrough = False
     
     return response
 
+# --- Métricas e Perfil ---
+# Limites superiores (segundos) dos buckets dos histogramas
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+class Histograma:
+    """ Histograma cumulativo no formato do Prometheus. """
+    def __init__(self):
+        self.contagens = [0] * len(BUCKETS_SEGUNDOS)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(BUCKETS_SEGUNDOS):
+            if valor <= limite:
+                self.contagens[i] += 1
+                break
+        self.soma += valor
+        self.total += 1
+
+class Metricas:
+    """ Histogramas de duração em processo, por nome de métrica e rótulos. """
+    def __init__(self):
+        self._histogramas = {}
+        self._lock = threading.Lock()
+
+    def observar(self, nome, segundos, **rotulos):
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._lock:
+            histograma = self._histogramas.get(chave)
+            if histograma is None:
+                histograma = self._histogramas[chave] = Histograma()
+            histograma.observar(segundos)
+
+    @contextlib.contextmanager
+    def medir(self, etapa, **rotulos):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar('ipen_etapa_segundos', time.perf_counter() - inicio, etapa=etapa, **rotulos)
+
+    def exportar(self):
+        """ Texto no formato de exposição do Prometheus (0.0.4). """
+        def formatar(rotulos):
+            return ','.join(f'{k}="{str(v)}"' for k, v in rotulos)
+        linhas = []
+        with self._lock:
+            itens = sorted(self._histogramas.items())
+        nomes_vistos = set()
+        for (nome, rotulos), histograma in itens:
+            if nome not in nomes_vistos:
+                nomes_vistos.add(nome)
+                linhas.append(f"# TYPE {nome} histogram")
+            acumulado = 0
+            for limite, contagem in zip(BUCKETS_SEGUNDOS, histograma.contagens):
+                acumulado += contagem
+                le = '+Inf' if limite == float('inf') else repr(limite)
+                linhas.append(f"{nome}_bucket{{{formatar(rotulos + (('le', le),))}}} {acumulado}")
+            sufixo = f"{{{formatar(rotulos)}}}" if rotulos else ""
+            linhas.append(f"{nome}_sum{sufixo} {histograma.soma}")
+            linhas.append(f"{nome}_count{sufixo} {histograma.total}")
+        return "\n".join(linhas) + "\n"
+
+metricas = Metricas()
+_perfil_lock = threading.Lock()
+
+@app.before_request
+def iniciar_medicao():
+    g.inicio_requisicao = time.perf_counter()
+    limiar = app.config['PERFIL_LIMIAR']
+    # Um perfil por vez por processo: profilers não podem ser ativados em paralelo
+    if limiar is not None and request.endpoint != 'exportar_metricas' and _perfil_lock.acquire(blocking=False):
+        g.perfil = iniciar_perfil()
+        if g.perfil is None: _perfil_lock.release()
+
+def iniciar_perfil():
+    """ Inicia o profiler configurado; pyinstrument é opcional e cai para cProfile se ausente. """
+    try:
+        if app.config['PERFIL_FERRAMENTA'] == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                app.logger.warning("pyinstrument não instalado; usando cProfile")
+            else:
+                perfil = Profiler(async_mode='disabled')
+                perfil.start()
+                return perfil
+        perfil = cProfile.Profile()
+        perfil.enable()
+        return perfil
+    except (ValueError, RuntimeError) as e:
+        app.logger.warning(f"Não foi possível iniciar o profiler: {e}")
+        return None
+
+def finalizar_medicao(endpoint, metodo, status, inicio, perfil):
+    duracao = time.perf_counter() - inicio
+    metricas.observar('ipen_requisicao_segundos', duracao, endpoint=endpoint, metodo=metodo, status=status)
+    if perfil is None:
+        return
+    try:
+        if isinstance(perfil, cProfile.Profile):
+            perfil.disable()
+        else:
+            perfil.stop()
+        if duracao >= app.config['PERFIL_LIMIAR']:
+            os.makedirs(app.config['PERFIL_DIR'], exist_ok=True)
+            base = os.path.join(app.config['PERFIL_DIR'], f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{int(duracao * 1000)}ms")
+            if isinstance(perfil, cProfile.Profile):
+                perfil.dump_stats(f"{base}.prof")
+            else:
+                with open(f"{base}.html", 'w', encoding='utf-8') as f:
+                    f.write(perfil.output_html())
+            app.logger.warning(f"Requisição lenta ({duracao:.2f}s) em {endpoint}: perfil salvo em {base}")
+    finally:
+        _perfil_lock.release()
+
+@app.route('/metricas', methods=['GET'])
+def exportar_metricas():
+    """Prometheus text endpoint with stage/request histograms and cache counters."""
+    linhas = [metricas.exportar(), "# TYPE ipen_cache_saida_eventos_total counter"]
+    estatisticas = cache_saida.estatisticas()
+    for evento in ('hits_memoria', 'hits_disco', 'misses', 'evictions', 'evictions_disco'):
+        linhas.append(f'ipen_cache_saida_eventos_total{{evento="{evento}"}} {estatisticas.get(evento, 0)}')
+    linhas.append("# TYPE ipen_cache_saida_bytes gauge")
+    linhas.append(f"ipen_cache_saida_bytes {estatisticas['bytes']}")
+    linhas.append("# TYPE ipen_admissao_eventos_total counter")
+    estado_admissao = controle_admissao.estatisticas()
+    for evento in ('admitidas', 'enfileiradas', 'rejeitadas_fila', 'rejeitadas_espera', 'limitadas_taxa'):
+        linhas.append(f'ipen_admissao_eventos_total{{evento="{evento}"}} {estado_admissao.get(evento, 0)}')
+    linhas.append("# TYPE ipen_admissao_em_execucao gauge")
+    linhas.append(f"ipen_admissao_em_execucao {estado_admissao['em_execucao']}")
+    linhas.append("# TYPE ipen_admissao_na_fila gauge")
+    linhas.append(f"ipen_admissao_na_fila {estado_admissao['na_fila']}")
+    linhas.append("# TYPE ipen_cache_layout_eventos_total counter")
+    estatisticas_layout = cache_layout.estatisticas()
+    for evento in ('hits', 'misses', 'evictions'):
+        linhas.append(f'ipen_cache_layout_eventos_total{{evento="{evento}"}} {estatisticas_layout.get(evento, 0)}')
+    linhas.append("# TYPE ipen_cache_layout_itens gauge")
+    linhas.append(f"ipen_cache_layout_itens {estatisticas_layout['itens']}")
+    linhas.append("# TYPE ipen_inicializacao_segundos gauge")
+    for fase, segundos in relatorio_inicializacao.items():
+        linhas.append(f'ipen_inicializacao_segundos{{fase="{fase}"}} {segundos}')
+    return Response("\n".join(linhas) + "\n", mimetype='text/plain; version=0.0.4')
+
 # --- Dicionário de Campos Necessários (para validação) ---
 CAMPOS_POR_DOCUMENTO = {
     "capa": ["nivel", "area", "nome_completo", "sobrenome", "titulo", "ano", "orientador_completo"],
@@ -55,14 +269,156 @@ CAMPOS_POR_DOCUMENTO = {
 
 # --- FUNÇÕES DE LIMPEZA E GERAÇÃO DE PDF ---
 
+# Tags cujo conteúdo é mantido sem a própria tag, e atributos permitidos por tag (os demais são removidos)
+TAGS_DESEMBRULHADAS = frozenset({'p', 'div'})
+ATRIBUTOS_PERMITIDOS = {'font': frozenset({'color', 'face', 'size'}), 'a': frozenset({'href'})}
+_TAGS_VAZIAS = frozenset({'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem', 'meta', 'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex', 'nextid', 'spacer'})
+_TAGS_PRESERVAM_ESPACOS = frozenset({'pre', 'textarea'})
+_TAGS_TEXTO_BRUTO = frozenset({'script', 'style'})
+_ESPACOS_ASCII = ' \n\t\x0c\r'
+_QUEBRAS_PARA_ESPACO = str.maketrans('\n\r', '  ')
+# Entidades nomeadas sem o ';', como no html.parser do BeautifulSoup
+_ENTIDADES = {nome[:-1]: caractere for nome, caractere in html.entities.html5.items() if nome.endswith(';')}
+
+def _escapar(texto):
+    return texto.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+def _atributo(valor):
+    valor = _escapar(valor)
+    if '"' not in valor: return f'"{valor}"'
+    if "'" not in valor: return f"'{valor}'"
+    return '"' + valor.replace('"', '&quot;') + '"'
+
+class _SanitizadorHTML(HTMLParser):
+    """
+    Sanitizador de passada única sobre o tokenizador incremental da biblioteca padrão.
+    Reproduz a saída de clean_html_for_reportlab_bs4 (mesmas regras de aninhamento,
+    espaços, entidades e serialização do BeautifulSoup, inclusive a ordem alfabética dos
+    atributos) sem montar a árvore do documento; tests/test_sanitizador.py compara as duas.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=False)  # entidades tratadas como no BeautifulSoup (handle_entityref)
+        self.saida = []
+        self.pilha = ['div']  # nó raiz que envolve o fragmento, como na versão BeautifulSoup
+        self._texto = []
+        self._preservando = 0
+
+    def _fechar_texto(self, especial=None):
+        if not self._texto: return
+        texto = ''.join(self._texto)
+        self._texto = []
+        if not self._preservando and not texto.strip(_ESPACOS_ASCII):
+            texto = '\n' if '\n' in texto else ' '
+        if especial is not None:
+            prefixo, sufixo = especial
+            texto = f"{prefixo}{texto}{sufixo}"
+        elif not (self.pilha and self.pilha[-1] in _TAGS_TEXTO_BRUTO):  # conteúdo bruto não é escapado
+            texto = _escapar(texto)
+        self.saida.append(texto.translate(_QUEBRAS_PARA_ESPACO))
+
+    def _especial(self, dados, prefixo, sufixo):
+        self._fechar_texto()
+        self._texto.append(dados)
+        self._fechar_texto((prefixo, sufixo))
+
+    def handle_starttag(self, tag, attrs, vazia=None):
+        self._fechar_texto()
+        if vazia is None: vazia = tag in _TAGS_VAZIAS
+        if tag not in TAGS_DESEMBRULHADAS and not (vazia and tag == 'br'):
+            permitidos = ATRIBUTOS_PERMITIDOS.get(tag, ())
+            atributos = {}
+            for nome, valor in attrs:
+                atributos[nome] = '' if valor is None else valor
+            # O formatador do BeautifulSoup serializa os atributos em ordem alfabética
+            partes = [f' {nome}={_atributo(valor)}' for nome, valor in sorted(atributos.items()) if nome in permitidos]
+            self.saida.append(f"<{tag}{''.join(partes)}{'/>' if vazia else '>'}")
+        elif vazia:
+            self.saida.append(' ')  # <br> vira espaço
+        if not vazia:
+            self.pilha.append(tag)
+            if tag in _TAGS_PRESERVAM_ESPACOS: self._preservando += 1
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in _TAGS_VAZIAS:
+            self.handle_starttag(tag, attrs)
+        else:
+            self.handle_starttag(tag, attrs, vazia=False)
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        self._fechar_texto()
+        if tag not in self.pilha: return  # fechamento sem abertura correspondente é ignorado
+        while True:
+            aberta = self.pilha.pop()
+            if aberta in _TAGS_PRESERVAM_ESPACOS: self._preservando -= 1
+            if aberta not in TAGS_DESEMBRULHADAS: self.saida.append(f"</{aberta}>")
+            if aberta == tag: break
+
+    def handle_data(self, data):
+        self._texto.append(data)
+
+    def handle_entityref(self, name):
+        # Entidade desconhecida vira texto literal, sem o ';' (mesma regra do BeautifulSoup)
+        self._texto.append(_ENTIDADES.get(name, f"&{name}"))
+
+    def handle_charref(self, name):
+        self._texto.append(html.unescape(f"&#{name};"))
+
+    def handle_comment(self, data):
+        self._especial(data, '<!--', '-->')
+
+    def handle_decl(self, decl):
+        self._especial(decl[len("DOCTYPE "):], '<!DOCTYPE ', '>\n')
+
+    def unknown_decl(self, data):
+        if data.upper().startswith("CDATA["): self._especial(data[len("CDATA["):], '<![CDATA[', ']]>')
+        else: self._especial(data, '<?', '?>')
+
+    def handle_pi(self, data):
+        self._especial(data, '<?', '>')
+
+    def resultado(self):
+        self.close()
+        self._fechar_texto()
+        while self.pilha:
+            aberta = self.pilha.pop()
+            if aberta not in TAGS_DESEMBRULHADAS: self.saida.append(f"</{aberta}>")
+        # Como na versão BeautifulSoup, a troca de <br> vale também para o que a serialização montou (ex.: "<b<br>")
+        return ''.join(self.saida).strip().replace('<br>', ' ').replace('<br/>', ' ').strip()
+
+# A LRU conta entradas, não bytes: só valores curtos (títulos, nomes, palavras-chave) são memorizados,
+# para que 1024 resumos longos não fiquem retidos na memória
+SANITIZAR_MEMO_MAX_CHARS = 4096
+
+@functools.lru_cache(maxsize=1024)
+def _sanitizar_html(html_string):
+    sanitizador = _SanitizadorHTML()
+    sanitizador.feed(f"{html_string}</div>")  # fecha o nó raiz como a versão BeautifulSoup (e termina entidades no fim)
+    return sanitizador.resultado()
+
 def clean_html_for_reportlab(html_string):
     """
     Limpa o HTML, removendo atributos e tags não suportados pelo ReportLab
     e tratando quebras de linha indesejadas de divs e ps.
+    Passada única com memo LRU: valores curtos repetidos não são reprocessados.
+    """
+    if not html_string or not isinstance(html_string, str):
+        return ""
+    if len(html_string) > SANITIZAR_MEMO_MAX_CHARS:
+        return _sanitizar_html.__wrapped__(html_string)
+    return _sanitizar_html(html_string)
+
+def clean_html_for_reportlab_bs4(html_string):
+    """
+    Implementação de referência com BeautifulSoup (usada para comparação e benchmark).
+    Limpa o HTML, removendo atributos e tags não suportados pelo ReportLab
+    e tratando quebras de linha indesejadas de divs e ps.
     """
     if not html_string or not isinstance(html_string, str):
         return ""
     
+    from bs4 import BeautifulSoup  # importação tardia: só a referência/benchmark usa o bs4
+
     # Adiciona um nó raiz para garantir que o BeautifulSoup processe fragmentos
     soup = BeautifulSoup(f"<div>{html_string}</div>", 'html.parser')
     
@@ -92,6 +448,117 @@ def static_file_path(filename):
     """ Retorna o caminho absoluto para um arquivo na pasta static. """
     return os.path.join(app.root_path, 'static', filename)
 
+# --- Registro de Recursos Estáticos ---
+LARGURA_LOGO_CAPA = 54*mm
+RESOLUCAO_IMAGENS_DPI = 300
+
+class RecursoImagem:
+    """
+    Imagem da pasta static lida e decodificada uma única vez por worker.
+    Guarda os bytes originais, as dimensões e variantes reamostradas por largura.
+    """
+    def __init__(self, caminho, mtime):
+        self.caminho = caminho
+        self.mtime = mtime
+        with open(caminho, 'rb') as f:
+            self.dados = f.read()
+        with Image.open(io.BytesIO(self.dados)) as im:
+            self.largura, self.altura = im.size
+        self._variantes = {}
+        self._xobjetos = {}
+        self._lock = threading.Lock()
+
+    def variante(self, largura_pt=None, dpi=RESOLUCAO_IMAGENS_DPI, qualidade=90):
+        """ Retorna os bytes JPEG da imagem reamostrada para a largura (em pontos) na resolução e qualidade pedidas. """
+        if largura_pt is None:
+            return self.dados
+        largura_px = round(largura_pt / 72 * dpi)
+        if largura_px >= self.largura:
+            return self.dados
+        chave = (largura_px, qualidade)
+        with self._lock:
+            if chave not in self._variantes:
+                altura_px = max(1, round(self.altura * largura_px / self.largura))
+                with Image.open(io.BytesIO(self.dados)) as im:
+                    reduzida = im.convert('RGB').resize((largura_px, altura_px), Image.LANCZOS)
+                saida = io.BytesIO()
+                reduzida.save(saida, format='JPEG', quality=qualidade, optimize=True)
+                self._variantes[chave] = saida.getvalue()
+            return self._variantes[chave]
+
+    def leitor(self, largura_pt=None, dpi=RESOLUCAO_IMAGENS_DPI, qualidade=90):
+        """ Cria um ImageReader novo sobre os bytes em cache (quem o desenhar ainda decodifica a imagem). """
+        return ImageReader(io.BytesIO(self.variante(largura_pt, dpi, qualidade)))
+
+    def xobjeto(self, largura_pt, dpi=RESOLUCAO_IMAGENS_DPI, qualidade=90):
+        """
+        Modelo do image XObject da variante, montado uma única vez: o drawImage decodificaria o JPEG
+        inteiro (para calcular o nome) e o codificaria em ASCII85 a cada canvas. Nunca é registrado
+        em um documento; desenhar_imagem registra uma cópia rasa por canvas.
+        """
+        chave = (largura_pt, dpi, qualidade)
+        with self._lock:
+            modelo = self._xobjetos.get(chave)
+        if modelo is None:
+            leitor = self.leitor(largura_pt, dpi, qualidade)
+            # Mesmo nome que o drawImage daria (dados RGB + máscara), para a saída não mudar
+            nome = canvas._digester(leitor.getRGBData() + b'auto')
+            modelo = pdfdoc.PDFImageXObject(nome, leitor, mask='auto')
+            modelo.name = nome
+            with self._lock:
+                modelo = self._xobjetos.setdefault(chave, modelo)
+        return modelo
+
+class RegistroRecursos:
+    """ Cache por processo dos recursos estáticos, invalidado quando o arquivo muda (mtime). """
+    def __init__(self):
+        self._itens = {}
+        self._lock = threading.Lock()
+
+    def obter(self, filename):
+        caminho = static_file_path(filename)
+        mtime = os.path.getmtime(caminho)
+        with self._lock:
+            item = self._itens.get(filename)
+            if item is None or item.mtime != mtime:
+                item = RecursoImagem(caminho, mtime)
+                self._itens[filename] = item
+            return item
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+recursos = RegistroRecursos()
+
+# --- Perfis de Saída do PDF ---
+@dataclasses.dataclass(frozen=True, slots=True)
+class PerfilSaida:
+    """
+    Otimização aplicada por todos os gerar_*: compressão zlib dos streams de conteúdo e
+    resolução/qualidade JPEG do logo. As fontes são as 14 padrão do PDF (Helvetica, Courier),
+    só referenciadas e nunca incorporadas, então não há incorporação nem subconjunto a escolher.
+    """
+    nome: str
+    compressao: bool  # False deixa os streams legíveis, útil só para depurar o layout
+    dpi_imagens: int
+    qualidade_jpeg: int
+
+PERFIS_SAIDA = {
+    # Padrão: logo em 300 dpi, para impressão e para o repositório institucional
+    'arquivo': PerfilSaida('arquivo', compressao=True, dpi_imagens=RESOLUCAO_IMAGENS_DPI, qualidade_jpeg=90),
+    # Leitura em tela e envio por e-mail
+    'web': PerfilSaida('web', compressao=True, dpi_imagens=150, qualidade_jpeg=80),
+    # Conferência antes da versão final: o menor arquivo, logo em resolução de tela
+    'rascunho': PerfilSaida('rascunho', compressao=True, dpi_imagens=72, qualidade_jpeg=60),
+}
+if app.config['PERFIL_SAIDA'] not in PERFIS_SAIDA:
+    raise ValueError(f"PERFIL_SAIDA inválido: {app.config['PERFIL_SAIDA']!r} (use {', '.join(PERFIS_SAIDA)})")
+
+def novo_canvas(buffer, perfil):
+    """ Canvas A4 com as opções do perfil de saída. """
+    return canvas.Canvas(buffer, pagesize=A4, pageCompression=int(perfil.compressao))
+
 def obter_texto_citacao(dados, incluir_disponivel_em=True, titulo_override=None, subtitulo_override=None):
     nome_citacao = dados.get('nome_citacao', '').strip()
     if not nome_citacao: return ""
@@ -125,237 +592,859 @@ def obter_texto_citacao(dados, incluir_disponivel_em=True, titulo_override=None,
         texto_fixo = " Instituto de Pesquisas Energéticas e Nucleares - IPEN-CNEN/SP. São Paulo."
     return f"{texto_base}{texto_fixo}"
 
-def gerar_capa(dados, buffer):
-    c = canvas.Canvas(buffer, pagesize=A4)
+# --- Registro do Trabalho ---
+# Campos de texto do formulário guardados no registro (os mesmos nomes de request.form)
+CAMPOS_FORMULARIO = (
+    "idioma", "versao", "nivel", "area", "licenca", "nome_citacao", "nome_completo", "sobrenome", "ano", "paginas",
+    "titulo", "subtitulo", "titulo_traduzido", "subtitulo_traduzido", "orientador_tipo", "orientador",
+    "coorientador_tipo", "coorientador", "resumo", "abstract", "bolsa",
+)
+
+# Textos que dependem só da categoria do nível: (linha institucional, texto do grau, programa); {area} é preenchido no registro
+TEXTOS_NIVEL = {
+    'mestrado_profissional': (
+        "Mestrado Profissional em Tecnologia das Radiações em Ciências da Saúde",
+        "Dissertação apresentada como parte dos requisitos para obtenção do Grau de Mestre Profissional em Tecnologia das Radiações em Ciências da Saúde na Área de {area}",
+        "Programa de Pós-Graduação em Tecnologia das Radiações em Ciências da Saúde ({area})",
+    ),
+    'mestrado': (
+        "Autarquia associada à Universidade de São Paulo",
+        "Dissertação apresentada como parte dos requisitos para obtenção do Grau de Mestre em Ciências na Área de Tecnologia Nuclear - {area}",
+        "Programa de Pós-Graduação em Tecnologia Nuclear ({area})",
+    ),
+    'doutorado': (
+        "Autarquia associada à Universidade de São Paulo",
+        "Tese apresentada como parte dos requisitos para obtenção do Grau de Doutor em Ciências na Área de Tecnologia Nuclear - {area}",
+        "Programa de Pós-Graduação em Tecnologia Nuclear ({area})",
+    ),
+}
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class RegistroTese:
+    """
+    Dados de um trabalho, montados uma única vez a partir do formulário já limpo (ou de um
+    registro do lote), com os valores derivados que os geradores usam já calculados.
+    Imutável e serializável (pickle), para ser compartilhado com os pools de renderização.
+    """
+    # Campos do formulário (CAMPOS_FORMULARIO), '' quando ausentes
+    idioma: str
+    versao: str
+    nivel: str
+    area: str
+    licenca: str
+    nome_citacao: str
+    nome_completo: str
+    sobrenome: str
+    ano: str
+    paginas: str
+    titulo: str
+    subtitulo: str
+    titulo_traduzido: str
+    subtitulo_traduzido: str
+    orientador_tipo: str
+    orientador: str
+    coorientador_tipo: str
+    coorientador: str
+    resumo: str
+    abstract: str
+    bolsa: str
+    # Palavras-chave (PT) e keywords (EN) preenchidas, na ordem dos campos 1..5
+    chaves: tuple
+    keywords: tuple
+    # Nome do perfil de saída (PERFIS_SAIDA); padrão PERFIL_SAIDA
+    perfil_saida: str
+    # Valores derivados
+    idioma_principal: str
+    categoria: str  # chave de CORES_FAIXAS
+    linha_instituicao: str
+    texto_grau: str
+    programa: str
+    titulo_completo: str
+    autor: str
+    citacao: str
+    citacao_resumo: str
+    citacao_abstract: str
+
+    @property
+    def perfil(self):
+        """ PerfilSaida do registro; ValueError se o nome não existe. """
+        try:
+            return PERFIS_SAIDA[self.perfil_saida]
+        except KeyError:
+            raise ValueError(f"Perfil de saída desconhecido: {self.perfil_saida}") from None
+
+    def para_dados(self):
+        """ Inverso de de_dados: o registro no formato de request.form, sem o perfil de saída (escolhido a cada geração). """
+        dados = {campo: getattr(self, campo) for campo in CAMPOS_FORMULARIO}
+        dados.update({f'chave{i}': valor for i, valor in enumerate(self.chaves, 1)})
+        dados.update({f'keyword{i}': valor for i, valor in enumerate(self.keywords, 1)})
+        return dados
+
+    @classmethod
+    def de_dados(cls, dados):
+        """ Monta o registro a partir de um dicionário no formato de request.form (já limpo por limpar_dados). """
+        campos = {campo: dados.get(campo) or '' for campo in CAMPOS_FORMULARIO}
+        categoria = categoria_nivel(campos['nivel'])
+        linha_instituicao, texto_grau, programa = TEXTOS_NIVEL[categoria]
+        titulo, subtitulo = campos['titulo'], campos['subtitulo']
+        return cls(
+            **campos,
+            chaves=tuple(v for v in (dados.get(f'chave{i}') for i in range(1, 6)) if v),
+            keywords=tuple(v for v in (dados.get(f'keyword{i}') for i in range(1, 6)) if v),
+            perfil_saida=dados.get('perfil_saida') or app.config['PERFIL_SAIDA'],
+            idioma_principal=campos['idioma'] or 'Português',
+            categoria=categoria,
+            linha_instituicao=linha_instituicao,
+            texto_grau=texto_grau.format(area=campos['area']),
+            programa=programa.format(area=campos['area']),
+            titulo_completo=titulo.strip() + (f": {subtitulo.strip()}" if subtitulo else ""),
+            autor=f"{campos['nome_completo']} {campos['sobrenome']}".upper(),
+            citacao=obter_texto_citacao(campos),
+            citacao_resumo=obter_texto_citacao(campos, incluir_disponivel_em=False),
+            citacao_abstract=obter_texto_citacao(campos, incluir_disponivel_em=False, titulo_override=campos['titulo_traduzido'], subtitulo_override=campos['subtitulo_traduzido']),
+        )
+
+# --- Registro de Estilos ---
+def _criar_estilos():
+    """ Constrói uma única vez todos os ParagraphStyle usados pelos geradores. """
+    styles = getSampleStyleSheet()
+    estilos = [
+        # Capa e página de rosto
+        ParagraphStyle(name='TituloCentro', parent=styles['h1'], fontName='Helvetica-Bold', fontSize=12, leading=14, alignment=TA_CENTER),
+        ParagraphStyle(name='NegritoCentro', parent=styles['Normal'], fontName='Helvetica-Bold', fontSize=12, leading=14, alignment=TA_CENTER),
+        ParagraphStyle(name='NegritoJustificado', parent=styles['Normal'], fontName='Helvetica-Bold', fontSize=12, leading=14, alignment=TA_JUSTIFY),
+        ParagraphStyle(name='NegritoEsquerda', parent=styles['Normal'], fontName='Helvetica-Bold', fontSize=12, leading=14, alignment=TA_LEFT),
+        ParagraphStyle(name='Versao', parent=styles['Normal'], fontName='Helvetica-Bold', fontSize=11, leading=13, alignment=TA_CENTER),
+        ParagraphStyle(name='Justificado', parent=styles['Normal'], fontName='Helvetica', fontSize=12, leading=14, alignment=TA_JUSTIFY),
+        ParagraphStyle(name='Esquerda', parent=styles['Normal'], fontName='Helvetica', fontSize=12, leading=14, alignment=TA_LEFT),
+        # Ficha catalográfica
+        ParagraphStyle(name='FichaNormal', fontName='Helvetica', fontSize=11, leading=13),
+        ParagraphStyle(name='FichaCitacao', fontName='Helvetica', fontSize=11, leading=13, alignment=TA_JUSTIFY),
+        ParagraphStyle(name='Ficha', fontName='Courier', fontSize=9, leading=11),
+        # Resumo e abstract
+        ParagraphStyle(name='ResumoTitulo', parent=styles['h1'], fontName='Helvetica-Bold', fontSize=12, alignment=TA_CENTER, spaceAfter=1*cm),
+        ParagraphStyle(name='ResumoCitacao', parent=styles['Normal'], fontName='Helvetica', fontSize=12, leading=14, alignment=TA_JUSTIFY, spaceAfter=1*cm),
+        ParagraphStyle(name='AbstractTitulo', fontName='Helvetica-Bold', fontSize=12, alignment=TA_CENTER, spaceAfter=1*cm),
+        ParagraphStyle(name='AbstractCitacao', fontName='Helvetica', fontSize=12, leading=13, alignment=TA_JUSTIFY, spaceAfter=1*cm),
+        ParagraphStyle(name='Corpo', parent=styles['Normal'], fontName='Helvetica', fontSize=12, leading=18, alignment=TA_JUSTIFY, spaceAfter=1*cm),
+        ParagraphStyle(name='PalavrasChave', parent=styles['Normal'], fontName='Helvetica', fontSize=12, leading=15),
+        # Contracapa
+        ParagraphStyle(name='ContraCapa', fontName='Helvetica-Bold', fontSize=10, leading=12, alignment=TA_CENTER),
+    ]
+    # Aquece as métricas das fontes padrão usadas nos estilos
+    for fonte in sorted({estilo.fontName for estilo in estilos}):
+        pdfmetrics.stringWidth("IPEN", fonte, 12)
+    return types.MappingProxyType({estilo.name: estilo for estilo in estilos})
+
+# Estilos compartilhados (somente leitura) por todos os gerar_*: ajuste a tipografia aqui.
+ESTILOS = _criar_estilos()
+
+# --- Modelos Estáticos e Cache de Renderização ---
+# Incrementar sempre que o layout fixo de capa/contracapa mudar, para invalidar o cache.
+VERSAO_MODELOS = 1
+
+CORES_FAIXAS = {
+    'mestrado_profissional': (129/255, 0/255, 64/255),
+    'mestrado': (30/255, 143/255, 113/255),
+    'doutorado': (52/255, 14/255, 113/255),
+}
+
+def categoria_nivel(nivel):
+    """ Normaliza o texto do nível para uma das chaves de CORES_FAIXAS. """
+    if nivel in CORES_FAIXAS: return nivel
+    if "Mestrado Profissional" in nivel: return 'mestrado_profissional'
+    if "Mestrado" in nivel: return 'mestrado'
+    return 'doutorado'
+
+@functools.lru_cache(maxsize=None)
+def geometria_faixas(documento):
+    """
+    Retângulos (x, y, largura, altura) das faixas coloridas de capa/contracapa e
+    a coordenada y da última faixa superior. Calculados uma única vez por tipo.
+    """
+    width, height = A4
+    top_margin, f_fina, f_grossa, esp, b_margin = 16*mm, 2.7*mm, 4.8*mm, 1.2*mm, 9*mm
+    y1 = height-top_margin-f_fina; y2 = y1-esp-f_grossa; y3 = y2-esp-f_fina
+    superiores = ((y1, f_fina), (y2, f_grossa), (y3, f_fina))
+    if documento == 'capa':
+        f_comp = 78*mm
+        retangulos = [r for y, h in superiores for r in ((0, y, f_comp, h), (width - f_comp, y, f_comp, h))]
+    else:
+        retangulos = [(0, y, width, h) for y, h in superiores]
+    retangulos += [(0, b_margin, width, f_fina), (0, b_margin + f_fina + esp, width, f_grossa), (0, b_margin + f_fina + esp + f_grossa + esp, width, f_fina)]
+    return tuple(retangulos), y3
+
+def desenhar_imagem(c, modelo, x, y, largura, altura):
+    """ Equivalente ao c.drawImage(..., preserveAspectRatio=True) para um modelo de RecursoImagem.xobjeto. """
+    nome_registro = c._doc.getXObjectName(modelo.name)
+    imagem = c._doc.idToObject.get(nome_registro)
+    if imagem is None:
+        # Cópia rasa: o registro marca o objeto com o nome interno do documento; os bytes são compartilhados
+        imagem = copy.copy(modelo)
+        c._setXObjects(imagem)
+        c._doc.Reference(imagem, nome_registro)
+        c._doc.addForm(modelo.name, imagem)
+    c._currentPageHasImages = 1
+    x, y, largura, altura, _ = canvas.aspectRatioFix(True, 'c', x, y, largura, altura, imagem.width, imagem.height)
+    c.saveState()
+    c.translate(x, y)
+    c.scale(largura, altura)
+    c._code.append(f"/{nome_registro} Do")
+    c.restoreState()
+    c._formsinuse.append(modelo.name)
+
+def desenhar_fundo(c, documento, categoria, perfil=None):
+    """
+    Desenha a camada fixa da página (faixas e, na capa, o logo) como um form XObject,
+    definido uma vez por canvas e reutilizado em cada página que o referencia.
+    O perfil de saída só define a resolução do logo da capa.
+    """
+    nome = f"fundo_{documento}_{categoria}"
+    if not c.hasForm(nome):
+        retangulos, y3 = geometria_faixas(documento)
+        c.beginForm(nome)
+        c.setFillColorRGB(*CORES_FAIXAS[categoria])
+        for x, y, w, h in retangulos:
+            c.rect(x, y, w, h, fill=1, stroke=0)
+        if documento == 'capa':
+            try:
+                width, _ = A4; f_fina, f_grossa, esp = 2.7*mm, 4.8*mm, 1.2*mm
+                logo = recursos.obter('ipen_logo_azul.jpg'); l_larg = LARGURA_LOGO_CAPA; l_alt = logo.altura * (l_larg/logo.largura)
+                y_logo = y3 + (f_grossa + 2*f_fina + 2*esp - l_alt) / 2
+                perfil = perfil or PERFIS_SAIDA['arquivo']
+                try:
+                    desenhar_imagem(c, logo.xobjeto(l_larg, perfil.dpi_imagens, perfil.qualidade_jpeg), (width-l_larg)/2, y_logo, l_larg, l_alt)
+                except Exception as e:
+                    # desenhar_imagem usa internos do ReportLab: se uma versão nova os mudar, o logo sai pelo caminho público
+                    app.logger.warning(f"Logo via drawImage (XObject em cache indisponível: {e})")
+                    c.drawImage(logo.leitor(l_larg, perfil.dpi_imagens, perfil.qualidade_jpeg), (width-l_larg)/2, y_logo, l_larg, l_alt, preserveAspectRatio=True)
+            except Exception as e:
+                print(f"Erro ao carregar o logo: {e}")
+        c.endForm()
+    c.doForm(nome)
+
+class CacheRenderizacao:
+    """ Cache por processo dos bytes de PDFs totalmente estáticos, chaveado por (documento, variante, versão). """
+    def __init__(self):
+        self._itens = {}
+        self._lock = threading.Lock()
+
+    def obter(self, chave, renderizar):
+        with self._lock:
+            conteudo = self._itens.get(chave)
+        if conteudo is None:
+            conteudo = renderizar()
+            with self._lock:
+                conteudo = self._itens.setdefault(chave, conteudo)
+        return conteudo
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+cache_modelos = CacheRenderizacao()
+
+class CacheLayout:
+    """
+    Parágrafos de texto fixo (rótulos, textos do grau, licença, endereço da contracapa) já quebrados
+    em linhas, por (texto, estilo, largura disponível), com LRU limitada a LAYOUT_MAX_ITENS.
+    Cada uso recebe uma cópia rasa: as linhas medidas são compartilhadas e só lidas no drawOn.
+    """
+    def __init__(self):
+        self._itens = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.contadores = collections.Counter()
+
+    def paragrafo(self, texto, estilo, largura):
+        """ Retorna (Paragraph pronto para drawOn, largura, altura). """
+        chave = (texto, estilo.name, largura)
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None:
+                self._itens.move_to_end(chave)
+                self.contadores['hits'] += 1
+        if item is None:
+            p = Paragraph(texto, estilo); w, h = p.wrap(largura, A4[1])  # a quebra de linhas não depende da altura
+            item = (p, w, h)
+            with self._lock:
+                self.contadores['misses'] += 1
+                self._itens[chave] = item
+                while len(self._itens) > app.config['LAYOUT_MAX_ITENS']:
+                    self._itens.popitem(last=False)
+                    self.contadores['evictions'] += 1
+        p, w, h = item
+        return copy.copy(p), w, h
+
+    def estatisticas(self):
+        with self._lock:
+            return dict(self.contadores, itens=len(self._itens))
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+cache_layout = CacheLayout()
+
+def desenhar_capa(c, registro):
     width, height = A4
-    nivel = dados.get("nivel", "")
-    
-    if "Mestrado Profissional" in nivel: cor_faixas = (129/255, 0/255, 64/255)
-    elif "Mestrado" in nivel: cor_faixas = (30/255, 143/255, 113/255)
-    else: cor_faixas = (52/255, 14/255, 113/255)
-    c.setFillColorRGB(*cor_faixas)
-    
-    top_margin, f_fina, f_grossa, esp, f_comp = 16*mm, 2.7*mm, 4.8*mm, 1.2*mm, 78*mm
-    y1, y2, y3 = height-top_margin-f_fina, height-top_margin-f_fina-esp-f_grossa, height-top_margin-f_fina-esp-f_grossa-esp-f_fina
-    
-    c.rect(0, y1, f_comp, f_fina, fill=1, stroke=0); c.rect(width - f_comp, y1, f_comp, f_fina, fill=1, stroke=0)
-    c.rect(0, y2, f_comp, f_grossa, fill=1, stroke=0); c.rect(width - f_comp, y2, f_comp, f_grossa, fill=1, stroke=0)
-    c.rect(0, y3, f_comp, f_fina, fill=1, stroke=0); c.rect(width - f_comp, y3, f_comp, f_fina, fill=1, stroke=0)
-    
-    b_margin = 9*mm
-    c.rect(0, b_margin, width, f_fina, fill=1, stroke=0)
-    c.rect(0, b_margin + f_fina + esp, width, f_grossa, fill=1, stroke=0)
-    c.rect(0, b_margin + f_fina + esp + f_grossa + esp, width, f_fina, fill=1, stroke=0)
     
-    try:
-        logo = ImageReader(static_file_path('ipen_logo_azul.jpg')); iw, ih = logo.getSize(); l_larg = 54*mm; l_alt = ih * (l_larg/iw)
-        y_logo = y3 + (f_grossa + 2*f_fina + 2*esp - l_alt) / 2
-        c.drawImage(logo, (width-l_larg)/2, y_logo, width=l_larg, height=l_alt, preserveAspectRatio=True, mask='auto')
-    except Exception as e:
-        print(f"Erro ao carregar o logo: {e}")
+    desenhar_fundo(c, 'capa', registro.categoria, registro.perfil)
+    _, y3 = geometria_faixas('capa')
     
-    c.setFillColorRGB(0,0,0); styles = getSampleStyleSheet()
-    s_titulo = ParagraphStyle(name='Center', parent=styles['h1'], fontName='Helvetica-Bold', fontSize=12, leading=14, alignment=TA_CENTER)
-    s_autor = ParagraphStyle(name='CenterAutor', parent=styles['Normal'], fontName='Helvetica-Bold', fontSize=12, leading=14, alignment=TA_CENTER)
-    s_just = ParagraphStyle(name='Justify', parent=styles['Normal'], fontName='Helvetica-Bold', fontSize=12, leading=14, alignment=TA_JUSTIFY)
-    s_orient = ParagraphStyle(name='LeftOrientador', parent=styles['Normal'], fontName='Helvetica-Bold', fontSize=12, leading=14, alignment=TA_LEFT)
+    c.setFillColorRGB(0,0,0)
+    s_titulo, s_autor, s_just, s_orient = ESTILOS['TituloCentro'], ESTILOS['NegritoCentro'], ESTILOS['NegritoJustificado'], ESTILOS['NegritoEsquerda']
     
     y = y3 - 20*mm; c.setFont("Helvetica-Bold", 12)
     c.drawCentredString(width/2, y, "INSTITUTO DE PESQUISAS ENERGÉTICAS E NUCLEARES"); y -= 0.5*cm
-    c.drawCentredString(width/2, y, "Mestrado Profissional em Tecnologia das Radiações em Ciências da Saúde" if "Mestrado Profissional" in nivel else "Autarquia associada à Universidade de São Paulo"); y -= 2.5*cm
+    c.drawCentredString(width/2, y, registro.linha_instituicao); y -= 2.5*cm
     
-    titulo_completo = dados.get('titulo','') + (f": {dados.get('subtitulo','')}" if dados.get('subtitulo') else ""); p_titulo = Paragraph(titulo_completo, s_titulo)
+    p_titulo = Paragraph(registro.titulo_completo, s_titulo)
     w, h = p_titulo.wrapOn(c, width-4*cm, y); p_titulo.drawOn(c, 2*cm, y-h); y -= h + 2*cm
     
-    autor = f"{dados.get('nome_completo','')} {dados.get('sobrenome','')}".upper(); p_autor = Paragraph(autor, s_autor)
+    p_autor = Paragraph(registro.autor, s_autor)
     w, h = p_autor.wrapOn(c, width-4*cm, y); p_autor.drawOn(c, 2*cm, y-h); y -= h + 4.5*cm
     
-    if "Mestrado Profissional" in nivel: t_final = f"Dissertação apresentada como parte dos requisitos para obtenção do Grau de Mestre Profissional em Tecnologia das Radiações em Ciências da Saúde na Área de {dados.get('area','')}"
-    elif "Mestrado" in nivel: t_final = f"Dissertação apresentada como parte dos requisitos para obtenção do Grau de Mestre em Ciências na Área de Tecnologia Nuclear - {dados.get('area','')}"
-    else: t_final = f"Tese apresentada como parte dos requisitos para obtenção do Grau de Doutor em Ciências na Área de Tecnologia Nuclear - {dados.get('area','')}"
-    
-    p_final = Paragraph(t_final, s_just); w, h = p_final.wrapOn(c, width/2-2*cm, y); p_final.drawOn(c, width/2, y-h); y -= h + 0.8*cm
+    p_final, w, h = cache_layout.paragrafo(registro.texto_grau, s_just, width/2-2*cm); p_final.drawOn(c, width/2, y-h); y -= h + 0.8*cm
     
-    if dados.get("orientador"):
-        p_label = Paragraph("Orientadora:" if "Profa" in dados.get("orientador_tipo") else "Orientador:", s_orient); w, h = p_label.wrapOn(c, width/2-2*cm, y); p_label.drawOn(c, width/2, y-h); y -= h + 0.1*cm
-        p_nome = Paragraph(f"{dados.get('orientador_tipo')} {dados.get('orientador')}", s_orient); w, h = p_nome.wrapOn(c, width/2-2*cm, y); p_nome.drawOn(c, width/2, y-h); y -= h + 0.8*cm
+    if registro.orientador:
+        p_label, w, h = cache_layout.paragrafo("Orientadora:" if "Profa" in registro.orientador_tipo else "Orientador:", s_orient, width/2-2*cm); p_label.drawOn(c, width/2, y-h); y -= h + 0.1*cm
+        p_nome = Paragraph(f"{registro.orientador_tipo} {registro.orientador}", s_orient); w, h = p_nome.wrapOn(c, width/2-2*cm, y); p_nome.drawOn(c, width/2, y-h); y -= h + 0.8*cm
     
-    if dados.get("coorientador"):
-        p_label_co = Paragraph("Coorientadora:" if "Profa" in dados.get("coorientador_tipo") else "Coorientador:", s_orient); w, h = p_label_co.wrapOn(c, width/2-2*cm, y); p_label_co.drawOn(c, width/2, y-h); y -= h + 0.1*cm
-        p_nome_co = Paragraph(f"{dados.get('coorientador_tipo')} {dados.get('coorientador')}", s_orient); w, h = p_nome_co.wrapOn(c, width/2-2*cm, y); p_nome_co.drawOn(c, width/2, y-h)
+    if registro.coorientador:
+        p_label_co, w, h = cache_layout.paragrafo("Coorientadora:" if "Profa" in registro.coorientador_tipo else "Coorientador:", s_orient, width/2-2*cm); p_label_co.drawOn(c, width/2, y-h); y -= h + 0.1*cm
+        p_nome_co = Paragraph(f"{registro.coorientador_tipo} {registro.coorientador}", s_orient); w, h = p_nome_co.wrapOn(c, width/2-2*cm, y); p_nome_co.drawOn(c, width/2, y-h)
     
-    c.setFont("Helvetica-Bold", 12); c.drawCentredString(width/2, 5.5*cm, "São Paulo"); c.drawCentredString(width/2, 5*cm, dados.get("ano","")); c.save()
+    c.setFont("Helvetica-Bold", 12); c.drawCentredString(width/2, 5.5*cm, "São Paulo"); c.drawCentredString(width/2, 5*cm, registro.ano)
 
-def gerar_pagina_rosto(dados, buffer):
-    c = canvas.Canvas(buffer, pagesize=A4)
+def gerar_capa(registro, buffer):
+    c = novo_canvas(buffer, registro.perfil); desenhar_capa(c, registro); c.save()
+
+def desenhar_pagina_rosto(c, registro):
     width, height = A4
-    nivel = dados.get("nivel", "")
     c.setFillColorRGB(0, 0, 0)
-    styles = getSampleStyleSheet()
-    style_normal_center = ParagraphStyle(name='Center', parent=styles['Normal'], fontName='Helvetica-Bold', fontSize=12, leading=14, alignment=TA_CENTER)
-    style_titulo = ParagraphStyle(name='TitleCenter', parent=styles['h1'], fontName='Helvetica-Bold', fontSize=12, leading=14, alignment=TA_CENTER)
-    style_versao = ParagraphStyle(name='VersionCenter', parent=styles['Normal'], fontName='Helvetica-Bold', fontSize=11, leading=13, alignment=TA_CENTER)
+    style_normal_center, style_titulo, style_versao = ESTILOS['NegritoCentro'], ESTILOS['TituloCentro'], ESTILOS['Versao']
     
     y = height - 2.5*cm 
     c.setFont("Helvetica-Bold", 12)
     c.drawCentredString(width/2, y, "INSTITUTO DE PESQUISAS ENERGÉTICAS E NUCLEARES"); y -= 0.5*cm
-    c.drawCentredString(width/2, y, "Mestrado Profissional em Tecnologia das Radiações em Ciências da Saúde" if "Mestrado Profissional" in nivel else "Autarquia associada à Universidade de São Paulo"); y -= 3*cm 
+    c.drawCentredString(width/2, y, registro.linha_instituicao); y -= 3*cm 
     
-    titulo_completo = dados.get('titulo','').strip() + (f": {dados.get('subtitulo','').strip()}" if dados.get('subtitulo','') else "")
-    p_titulo = Paragraph(titulo_completo, style_titulo)
+    p_titulo = Paragraph(registro.titulo_completo, style_titulo)
     w, h = p_titulo.wrapOn(c, width-4*cm, y); p_titulo.drawOn(c, 2*cm, y - h); y -= h + 0.8*cm
     
-    versao_texto = "Versão Corrigida<br/>Versão Original Disponível no IPEN" if dados.get('versao','') == 'Versão Corrigida' else "Versão Original"
-    p_versao = Paragraph(versao_texto, style_versao)
-    w, h = p_versao.wrapOn(c, width-4*cm, y); p_versao.drawOn(c, 2*cm, y - h); y -= h + 2*cm
+    versao_texto = "Versão Corrigida<br/>Versão Original Disponível no IPEN" if registro.versao == 'Versão Corrigida' else "Versão Original"
+    p_versao, w, h = cache_layout.paragrafo(versao_texto, style_versao, width-4*cm); p_versao.drawOn(c, 2*cm, y - h); y -= h + 2*cm
     
-    autor = f"{dados.get('nome_completo','')} {dados.get('sobrenome','')}".upper()
-    p_autor = Paragraph(autor, style_normal_center)
+    p_autor = Paragraph(registro.autor, style_normal_center)
     w, h = p_autor.wrapOn(c, width-4*cm, y); p_autor.drawOn(c, 2*cm, y - h); y -= h + 4.5*cm
     
-    style_justificado = ParagraphStyle(name='Justify', parent=styles['Normal'], fontName='Helvetica', fontSize=12, leading=14, alignment=TA_JUSTIFY)
-    style_orientador = ParagraphStyle(name='LeftOrientador', parent=styles['Normal'], fontName='Helvetica', fontSize=12, leading=14, alignment=TA_LEFT)
+    style_justificado, style_orientador = ESTILOS['Justificado'], ESTILOS['Esquerda']
     
-    if "Mestrado Profissional" in nivel: texto_final = f"Dissertação apresentada como parte dos requisitos para obtenção do Grau de Mestre Profissional em Tecnologia das Radiações em Ciências da Saúde na Área de {dados.get('area','')}"
-    elif "Mestrado" in nivel: texto_final = f"Dissertação apresentada como parte dos requisitos para obtenção do Grau de Mestre em Ciências na Área de Tecnologia Nuclear - {dados.get('area','')}"
-    else: texto_final = f"Tese apresentada como parte dos requisitos para obtenção do Grau de Doutor em Ciências na Área de Tecnologia Nuclear - {dados.get('area','')}"
+    p_texto_final, w, h = cache_layout.paragrafo(registro.texto_grau, style_justificado, width/2 - 2*cm); p_texto_final.drawOn(c, width/2, y - h); y -= h + 0.8*cm
     
-    p_texto_final = Paragraph(texto_final, style_justificado)
-    w, h = p_texto_final.wrapOn(c, width/2 - 2*cm, y); p_texto_final.drawOn(c, width/2, y - h); y -= h + 0.8*cm
+    if registro.orientador:
+        p_label, w, h = cache_layout.paragrafo("Orientadora:" if "Profa" in registro.orientador_tipo else "Orientador:", style_orientador, width/2-2*cm); p_label.drawOn(c, width/2, y-h); y -= h + 0.1*cm
+        p_nome = Paragraph(f"{registro.orientador_tipo} {registro.orientador}", style_orientador); w, h = p_nome.wrapOn(c, width/2-2*cm, y); p_nome.drawOn(c, width/2, y-h); y -= h + 0.8*cm
     
-    if dados.get("orientador"):
-        p_label = Paragraph("Orientadora:" if "Profa" in dados.get("orientador_tipo") else "Orientador:", style_orientador); w, h = p_label.wrapOn(c, width/2-2*cm, y); p_label.drawOn(c, width/2, y-h); y -= h + 0.1*cm
-        p_nome = Paragraph(f"{dados.get('orientador_tipo')} {dados.get('orientador')}", style_orientador); w, h = p_nome.wrapOn(c, width/2-2*cm, y); p_nome.drawOn(c, width/2, y-h); y -= h + 0.8*cm
+    if registro.coorientador:
+        p_label_co, w, h = cache_layout.paragrafo("Coorientadora:" if "Profa" in registro.coorientador_tipo else "Coorientador:", style_orientador, width/2-2*cm); p_label_co.drawOn(c, width/2, y-h); y -= h + 0.1*cm
+        p_nome_co = Paragraph(f"{registro.coorientador_tipo} {registro.coorientador}", style_orientador); w, h = p_nome_co.wrapOn(c, width/2-2*cm, y); p_nome_co.drawOn(c, width/2, y-h)
     
-    if dados.get("coorientador"):
-        p_label_co = Paragraph("Coorientadora:" if "Profa" in dados.get("coorientador_tipo") else "Coorientador:", style_orientador); w, h = p_label_co.wrapOn(c, width/2-2*cm, y); p_label_co.drawOn(c, width/2, y-h); y -= h + 0.1*cm
-        p_nome_co = Paragraph(f"{dados.get('coorientador_tipo')} {dados.get('coorientador')}", style_orientador); w, h = p_nome_co.wrapOn(c, width/2-2*cm, y); p_nome_co.drawOn(c, width/2, y-h)
-    
-    c.setFont("Helvetica", 12); c.drawCentredString(width/2, 5.5*cm, "São Paulo"); c.drawCentredString(width/2, 5*cm, dados.get("ano","")); c.save()
+    c.setFont("Helvetica", 12); c.drawCentredString(width/2, 5.5*cm, "São Paulo"); c.drawCentredString(width/2, 5*cm, registro.ano)
+
+def gerar_pagina_rosto(registro, buffer):
+    c = novo_canvas(buffer, registro.perfil); desenhar_pagina_rosto(c, registro); c.save()
 
-def gerar_ficha_catalografica(dados, buffer):
-    c = canvas.Canvas(buffer, pagesize=A4); width, height = A4; margem_esq = 2.5*cm; largura_texto = width - 2*margem_esq; y = height - 2.5*cm
-    styles = getSampleStyleSheet(); style_normal = ParagraphStyle(name='Normal', fontName='Helvetica', fontSize=11, leading=13)
+def desenhar_ficha_catalografica(c, registro):
+    width, height = A4; margem_esq = 2.5*cm; largura_texto = width - 2*margem_esq; y = height - 2.5*cm
+    style_normal = ESTILOS['FichaNormal']
     
-    if dados.get('bolsa'): texto_bolsa = f"Fonte de Financiamento: {dados['bolsa']}"; p_bolsa = Paragraph(texto_bolsa, style_normal); w, h = p_bolsa.wrapOn(c, largura_texto, y); p_bolsa.drawOn(c, margem_esq, y-h); y -= h + 25
+    if registro.bolsa: texto_bolsa = f"Fonte de Financiamento: {registro.bolsa}"; p_bolsa = Paragraph(texto_bolsa, style_normal); w, h = p_bolsa.wrapOn(c, largura_texto, y); p_bolsa.drawOn(c, margem_esq, y-h); y -= h + 25
 
-    texto_licenca = f"Autorizo a reprodução e divulgação deste trabalho acadêmico, total ou parcialmente, sob os termos da licença <b>{dados.get('licenca','')}</b>, permitindo seu uso e compartilhamento, desde que os devidos créditos sejam atribuídos e as condições estabelecidas na licença sejam respeitadas."
-    p_licenca = Paragraph(texto_licenca, style_normal); w, h = p_licenca.wrapOn(c, largura_texto, y); p_licenca.drawOn(c, margem_esq, y-h); y -= h + 25
+    texto_licenca = f"Autorizo a reprodução e divulgação deste trabalho acadêmico, total ou parcialmente, sob os termos da licença <b>{registro.licenca}</b>, permitindo seu uso e compartilhamento, desde que os devidos créditos sejam atribuídos e as condições estabelecidas na licença sejam respeitadas."
+    p_licenca, w, h = cache_layout.paragrafo(texto_licenca, style_normal, largura_texto); p_licenca.drawOn(c, margem_esq, y-h); y -= h + 25
     
     c.setFont("Helvetica", 11); c.drawString(margem_esq, y, "Como citar:"); y -= 15
-    p_citacao = Paragraph(obter_texto_citacao(dados), ParagraphStyle(name='Citacao', fontName='Helvetica', fontSize=11, leading=13, alignment=TA_JUSTIFY)); w, h = p_citacao.wrapOn(c, largura_texto-10, y); p_citacao.drawOn(c, margem_esq, y-h); y -= h + 15
+    p_citacao = Paragraph(registro.citacao, ESTILOS['FichaCitacao']); w, h = p_citacao.wrapOn(c, largura_texto-10, y); p_citacao.drawOn(c, margem_esq, y-h); y -= h + 15
     
     largura_quadro = largura_texto * 0.80; x_quadro = margem_esq + (largura_texto - largura_quadro)/2; y_quadro_topo = 4*cm
-    orientador = dados.get("orientador", ""); texto_orientador = f"orientadora {orientador}" if "Profa" in dados.get("orientador_tipo", "") else f"orientador {orientador}"
-    coorientador = dados.get("coorientador", ""); texto_coorientador = f"coorientadora {coorientador}" if "Profa" in dados.get("coorientador_tipo", "") else f"coorientador {coorientador}"
-    programa = f"Programa de Pós-Graduação em Tecnologia das Radiações em Ciências da Saúde ({dados.get('area','')})" if "Mestrado Profissional" in dados.get('nivel','') else f"Programa de Pós-Graduação em Tecnologia Nuclear ({dados.get('area','')})"
-    titulo_completo_ficha = dados.get('titulo','').strip() + (f": {dados['subtitulo'].strip()}" if dados.get('subtitulo') else "")
+    orientador = registro.orientador; texto_orientador = f"orientadora {orientador}" if "Profa" in registro.orientador_tipo else f"orientador {orientador}"
+    coorientador = registro.coorientador; texto_coorientador = f"coorientadora {coorientador}" if "Profa" in registro.coorientador_tipo else f"coorientador {coorientador}"
     romanos = f"I. {orientador}, orient. II. {coorientador}, coorient. III. Título." if orientador and coorientador else (f"I. {orientador}, orient. II. Título." if orientador else "I. Título.")
     
-    chaves_base = 'chave' if dados.get('idioma') == 'Português' else 'keyword'
-    chaves_filtradas = [dados.get(f'{chaves_base}{i+1}', '') for i in range(5) if dados.get(f'{chaves_base}{i+1}', '')]
+    chaves_filtradas = registro.chaves if registro.idioma == 'Português' else registro.keywords
     chaves_formatadas = " ".join([f"{i+1}. {chave.strip()}." for i, chave in enumerate(chaves_filtradas)])
     
-    partes_texto = [f"{dados.get('sobrenome','')}, {dados.get('nome_completo','')}<br/>", f"{titulo_completo_ficha} / {dados.get('nome_completo','')} {dados.get('sobrenome','')}"]
+    partes_texto = [f"{registro.sobrenome}, {registro.nome_completo}<br/>", f"{registro.titulo_completo} / {registro.nome_completo} {registro.sobrenome}"]
     if orientador: partes_texto.append(f". {texto_orientador}")
     if coorientador: partes_texto.append(f". {texto_coorientador}")
-    partes_texto.append(f". São Paulo, {dados.get('ano','')}.<br/>")
+    partes_texto.append(f". São Paulo, {registro.ano}.<br/>")
     
-    texto_ficha = f"""{"".join(partes_texto)}<br/>{dados.get('paginas','')} p.<br/><br/>{dados.get('nivel','')} - {programa} -- Instituto de Pesquisas Energéticas e Nucleares. Universidade de São Paulo.<br/><br/>&nbsp;&nbsp;&nbsp;{chaves_formatadas}<br/>{romanos}""".strip()
-    p_ficha = Paragraph(texto_ficha.replace("\n", ""), ParagraphStyle(name='Ficha', fontName='Courier', fontSize=9, leading=11)); w, h = p_ficha.wrapOn(c, largura_quadro-20, height); altura_quadro = max(6.5 * cm, h + 20)
+    texto_ficha = f"""{"".join(partes_texto)}<br/>{registro.paginas} p.<br/><br/>{registro.nivel} - {registro.programa} -- Instituto de Pesquisas Energéticas e Nucleares. Universidade de São Paulo.<br/><br/>&nbsp;&nbsp;&nbsp;{chaves_formatadas}<br/>{romanos}""".strip()
+    p_ficha = Paragraph(texto_ficha.replace("\n", ""), ESTILOS['Ficha']); w, h = p_ficha.wrapOn(c, largura_quadro-20, height); altura_quadro = max(6.5 * cm, h + 20)
     c.rect(x_quadro, y_quadro_topo, largura_quadro, altura_quadro); p_ficha.drawOn(c, x_quadro + 10, y_quadro_topo + altura_quadro - 10 - h)
     
     c.setFont("Helvetica", 10); c.drawCentredString(width/2, y_quadro_topo + altura_quadro + 30, "Ficha catalográfica elaborada pelo Sistema de geração automática da Biblioteca IPEN,")
-    c.drawCentredString(width/2, y_quadro_topo + altura_quadro + 18, "com os dados fornecidos pelo(a) autor(a)."); c.save()
+    c.drawCentredString(width/2, y_quadro_topo + altura_quadro + 18, "com os dados fornecidos pelo(a) autor(a).")
 
-def gerar_resumo(dados, idioma_principal, buffer):
-    doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=2.5*cm, rightMargin=2.5*cm, topMargin=2.5*cm, bottomMargin=2.5*cm)
-    styles = getSampleStyleSheet()
+def gerar_ficha_catalografica(registro, buffer):
+    c = novo_canvas(buffer, registro.perfil); desenhar_ficha_catalografica(c, registro); c.save()
+
+# Margens das páginas de texto corrido (resumo/abstract)
+MARGEM_TEXTO = 2.5*cm
+
+def historia_resumo(registro, idioma_principal):
     story = [
-        Paragraph("ABSTRACT" if idioma_principal == "Inglês" else "RESUMO", ParagraphStyle(name='Title', parent=styles['h1'], fontName='Helvetica-Bold', fontSize=12, alignment=TA_CENTER, spaceAfter=1*cm)),
-        Paragraph(obter_texto_citacao(dados, incluir_disponivel_em=False, titulo_override=dados.get('titulo'), subtitulo_override=dados.get('subtitulo')), ParagraphStyle(name='Citacao', parent=styles['Normal'], fontName='Helvetica', fontSize=12, leading=14, alignment=TA_JUSTIFY, spaceAfter=1*cm)),
-        Paragraph(dados.get('resumo', ''), ParagraphStyle(name='Body', parent=styles['Normal'], fontName='Helvetica', fontSize=12, leading=18, alignment=TA_JUSTIFY, spaceAfter=1*cm))
+        Paragraph("ABSTRACT" if idioma_principal == "Inglês" else "RESUMO", ESTILOS['ResumoTitulo']),
+        Paragraph(registro.citacao_resumo, ESTILOS['ResumoCitacao']),
+        Paragraph(registro.resumo, ESTILOS['Corpo'])
     ]
-    chaves_base, rotulo = ('keyword', "<b>Keywords:</b> ") if idioma_principal == "Inglês" else ('chave', "<b>Palavras-chave:</b> ")
-    chaves_filtradas = [dados.get(f'{chaves_base}{i+1}', '') for i in range(5) if dados.get(f'{chaves_base}{i+1}', '')]
-    if chaves_filtradas: story.append(Paragraph(rotulo + ", ".join(chaves_filtradas), ParagraphStyle(name='Keywords', parent=styles['Normal'], fontName='Helvetica', fontSize=12, leading=15)))
-    doc.build(story)
+    chaves_filtradas, rotulo = (registro.keywords, "<b>Keywords:</b> ") if idioma_principal == "Inglês" else (registro.chaves, "<b>Palavras-chave:</b> ")
+    if chaves_filtradas: story.append(Paragraph(rotulo + ", ".join(chaves_filtradas), ESTILOS['PalavrasChave']))
+    return story
 
-def gerar_abstract(dados, idioma_principal, buffer):
-    doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=2.5*cm, rightMargin=2.5*cm, topMargin=2.5*cm, bottomMargin=2.5*cm)
-    styles = getSampleStyleSheet()
+def historia_abstract(registro, idioma_principal):
     story = [
-        Paragraph("RESUMO" if idioma_principal == "Inglês" else "ABSTRACT", ParagraphStyle(name='Title', fontName='Helvetica-Bold', fontSize=12, alignment=TA_CENTER, spaceAfter=1*cm)),
-        Paragraph(obter_texto_citacao(dados, incluir_disponivel_em=False, titulo_override=dados.get('titulo_traduzido'), subtitulo_override=dados.get('subtitulo_traduzido')), ParagraphStyle(name='Citacao', fontName='Helvetica', fontSize=12, leading=13, alignment=TA_JUSTIFY, spaceAfter=1*cm)),
-        Paragraph(dados.get('abstract', ''), ParagraphStyle(name='Body', parent=styles['Normal'], fontName='Helvetica', fontSize=12, leading=18, alignment=TA_JUSTIFY, spaceAfter=1*cm))
+        Paragraph("RESUMO" if idioma_principal == "Inglês" else "ABSTRACT", ESTILOS['AbstractTitulo']),
+        Paragraph(registro.citacao_abstract, ESTILOS['AbstractCitacao']),
+        Paragraph(registro.abstract, ESTILOS['Corpo'])
     ]
-    chaves_base, rotulo = ('chave', "<b>Palavras-chave:</b> ") if idioma_principal == "Inglês" else ('keyword', "<b>Keywords:</b> ")
-    chaves_filtradas = [dados.get(f'{chaves_base}{i+1}', '') for i in range(5) if dados.get(f'{chaves_base}{i+1}', '')]
-    if chaves_filtradas: story.append(Paragraph(rotulo + ", ".join(chaves_filtradas), ParagraphStyle(name='Keywords', parent=styles['Normal'], fontName='Helvetica', fontSize=12, leading=15)))
-    doc.build(story)
+    chaves_filtradas, rotulo = (registro.chaves, "<b>Palavras-chave:</b> ") if idioma_principal == "Inglês" else (registro.keywords, "<b>Keywords:</b> ")
+    if chaves_filtradas: story.append(Paragraph(rotulo + ", ".join(chaves_filtradas), ESTILOS['PalavrasChave']))
+    return story
 
-def gerar_contracapa(dados, buffer):
-    c = canvas.Canvas(buffer, pagesize=A4)
+def _documento_texto(buffer, perfil):
+    return SimpleDocTemplate(buffer, pagesize=A4, leftMargin=MARGEM_TEXTO, rightMargin=MARGEM_TEXTO, topMargin=MARGEM_TEXTO, bottomMargin=MARGEM_TEXTO, pageCompression=int(perfil.compressao))
+
+def gerar_resumo(registro, idioma_principal, buffer):
+    _documento_texto(buffer, registro.perfil).build(historia_resumo(registro, idioma_principal))
+
+def gerar_abstract(registro, idioma_principal, buffer):
+    _documento_texto(buffer, registro.perfil).build(historia_abstract(registro, idioma_principal))
+
+def desenhar_historia(c, story):
+    """
+    Desenha flowables diretamente em um canvas, página a página, com a mesma moldura
+    (Frame) que o SimpleDocTemplate de gerar_resumo/gerar_abstract usaria.
+    """
     width, height = A4
-    nivel = dados.get("nivel", "")
-    
-    if "Mestrado Profissional" in nivel: cor_faixas = (129/255, 0/255, 64/255)
-    elif "Mestrado" in nivel: cor_faixas = (30/255, 143/255, 113/255)
-    else: cor_faixas = (52/255, 14/255, 113/255)
-    c.setFillColorRGB(*cor_faixas)
+    pendentes = list(story)
+    while pendentes:
+        frame = Frame(MARGEM_TEXTO, MARGEM_TEXTO, width - 2*MARGEM_TEXTO, height - 2*MARGEM_TEXTO, id='normal')
+        vazio = True
+        while pendentes:
+            flowable = pendentes.pop(0)
+            if frame.add(flowable, c, trySplit=1):
+                vazio = False
+                continue
+            partes = frame.split(flowable, c)
+            if partes and frame.add(partes[0], c, trySplit=0):
+                vazio = False
+                pendentes[0:0] = partes[1:]
+                continue
+            if vazio:
+                raise LayoutError(f"Conteúdo grande demais para uma página: {flowable.identity(30)}")
+            pendentes.insert(0, flowable)
+            break
+        if pendentes: c.showPage()
 
-    f_fina, f_grossa, esp = 2.7*mm, 4.8*mm, 1.2*mm
-    c.rect(0, height - 16*mm - f_fina, width, f_fina, fill=1, stroke=0)
-    c.rect(0, height - 16*mm - f_fina - esp - f_grossa, width, f_grossa, fill=1, stroke=0)
-    c.rect(0, height - 16*mm - f_fina - esp - f_grossa - esp - f_fina, width, f_fina, fill=1, stroke=0)
+def desenhar_contracapa(c, categoria):
+    width, height = A4
+    desenhar_fundo(c, 'contracapa', categoria)
     b_margin = 9*mm
-    c.rect(0, b_margin, width, f_fina, fill=1, stroke=0)
-    c.rect(0, b_margin + f_fina + esp, width, f_grossa, fill=1, stroke=0)
-    c.rect(0, b_margin + f_fina + esp + f_grossa + esp, width, f_fina, fill=1, stroke=0)
     c.setFillColorRGB(0,0,0)
     texto = """INSTITUTO DE PESQUISAS ENERGÉTICAS E NUCLEARES<br/>Av. Prof. Lineu Prestes, 2242 - Cidade Universitária - CEP: 05508-000<br/>Fone: (11) 2810-5000<br/>São Paulo - SP - Brasil<br/>https://www.gov.br/ipen<br/><br/>O IPEN é uma Autarquia vinculada à Secretaria de Desenvolvimento, associada<br/>à Universidade de São Paulo e gerida técnica e administrativamente pela<br/>Comissão Nacional de Energia Nuclear, órgão do<br/>Ministério da Ciência, Tecnologia e Inovação."""
-    p = Paragraph(texto, ParagraphStyle(name='ContraCapa', fontName='Helvetica-Bold', fontSize=10, leading=12, alignment=TA_CENTER))
-    w, h = p.wrapOn(c, width - 4*cm, height)
+    p, w, h = cache_layout.paragrafo(texto, ESTILOS['ContraCapa'], width - 4*cm)
     p.drawOn(c, 2*cm, b_margin + 4*cm)
-    c.save()
+
+def _renderizar_contracapa(categoria, perfil):
+    buffer = io.BytesIO()
+    c = novo_canvas(buffer, perfil); desenhar_contracapa(c, categoria); c.save()
+    return buffer.getvalue()
+
+def gerar_contracapa(registro, buffer):
+    """ A contracapa só depende do nível (e do perfil): o PDF pronto é servido do cache de modelos. """
+    categoria, perfil = registro.categoria, registro.perfil
+    buffer.write(cache_modelos.obter(('contracapa', categoria, perfil.nome, VERSAO_MODELOS), lambda: _renderizar_contracapa(categoria, perfil)))
+
+# --- Cache de Saída (endereçado por conteúdo) ---
+# Incrementar sempre que qualquer gerar_* mudar a saída, para invalidar o cache de PDFs.
+VERSAO_GERADORES = 2
+
+# Expansão dos campos compostos de CAMPOS_POR_DOCUMENTO em atributos do RegistroTese e campos opcionais lidos por cada gerador
+CAMPOS_COMPOSTOS = {
+    "orientador_completo": ["orientador_tipo", "orientador", "coorientador_tipo", "coorientador"],
+    "chaves_keywords": ["chaves", "keywords"],
+    "resumos": ["resumo", "abstract"],
+}
+CAMPOS_OPCIONAIS_POR_DOCUMENTO = {
+    "capa": ["subtitulo"],
+    "pagina_rosto": ["subtitulo"],
+    "ficha": ["subtitulo", "bolsa"],
+    "resumo": ["subtitulo", "subtitulo_traduzido"],
+    "abstract": ["subtitulo", "subtitulo_traduzido"],
+    "contracapa": [],
+}
+
+@functools.lru_cache(maxsize=None)
+def campos_consumidos(documento):
+    """ Todos os campos do registro que influenciam a saída do documento, em ordem estável. """
+    campos = set(CAMPOS_OPCIONAIS_POR_DOCUMENTO.get(documento, []))
+    for campo in CAMPOS_POR_DOCUMENTO.get(documento, []):
+        campos.update(CAMPOS_COMPOSTOS.get(campo, [campo]))
+    return tuple(sorted(campos))
+
+def chave_saida(registro, filename, func):
+    """ Hash canônico dos campos consumidos + documento + gerador + perfil de saída + versões. """
+    documento = os.path.splitext(filename)[0]
+    canonico = json.dumps({
+        'documento': documento,
+        'gerador': func.__name__,
+        'perfil': registro.perfil_saida,
+        'versao': [VERSAO_GERADORES, VERSAO_MODELOS],
+        'campos': {campo: getattr(registro, campo) for campo in campos_consumidos(documento)},
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonico.encode('utf-8')).hexdigest()
+
+def gravar_atomico(caminho, conteudo):
+    """ Grava via arquivo temporário + os.replace: outro worker nunca lê arquivo parcial. O temporário não sobra se a gravação falhar. """
+    temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temporario, 'wb') as f:
+            f.write(conteudo)
+        os.replace(temporario, caminho)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temporario)
+        raise
+
+class CacheSaida:
+    """
+    Cache de PDFs prontos: camada em memória com LRU limitada em bytes e camada opcional
+    em disco (CACHE_SAIDA_DIR), compartilhada entre os workers do gunicorn. No disco, o mtime
+    marca o último acesso; acima de CACHE_SAIDA_DISCO_MAX_BYTES os mais antigos são removidos.
+    """
+    PODA_DISCO_ALVO = 0.9  # fração do limite que sobra depois de uma poda
+    PODA_DISCO_INTERVALO = 60.0  # segundos entre varreduras, para contar o que os outros workers gravaram
+
+    def __init__(self):
+        self._itens = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.contadores = collections.Counter()
+        self._lock_disco = threading.Lock()
+        self._bytes_disco = None  # estimativa deste processo; None até a primeira varredura
+        self._varredura_disco = 0.0
+
+    def _caminho_disco(self, chave):
+        diretorio = app.config['CACHE_SAIDA_DIR']
+        return os.path.join(diretorio, chave[:2], f"{chave}.pdf") if diretorio else None
+
+    def obter(self, chave):
+        with self._lock:
+            conteudo = self._itens.get(chave)
+            if conteudo is not None:
+                self._itens.move_to_end(chave)
+                self.contadores['hits_memoria'] += 1
+                return conteudo
+        caminho = self._caminho_disco(chave)
+        if caminho:
+            try:
+                with open(caminho, 'rb') as f:
+                    conteudo = f.read()
+            except OSError:
+                conteudo = None
+            if conteudo:
+                with contextlib.suppress(OSError):
+                    os.utime(caminho)
+                with self._lock:
+                    self.contadores['hits_disco'] += 1
+                self._guardar_memoria(chave, conteudo)
+                return conteudo
+        with self._lock:
+            self.contadores['misses'] += 1
+        return None
+
+    def guardar(self, chave, conteudo):
+        self._guardar_memoria(chave, conteudo)
+        caminho = self._caminho_disco(chave)
+        if caminho and not os.path.exists(caminho):
+            try:
+                os.makedirs(os.path.dirname(caminho), exist_ok=True)
+                gravar_atomico(caminho, conteudo)
+            except OSError as e:
+                app.logger.warning(f"Não foi possível gravar o cache em disco: {e}")
+                return
+            self._podar_disco(len(conteudo))
+
+    def _podar_disco(self, gravados):
+        limite = app.config['CACHE_SAIDA_DISCO_MAX_BYTES']
+        if limite <= 0:
+            return
+        with self._lock_disco:
+            if self._bytes_disco is not None:
+                self._bytes_disco += gravados
+                if self._bytes_disco <= limite and time.monotonic() - self._varredura_disco < self.PODA_DISCO_INTERVALO:
+                    return
+            self._varredura_disco = time.monotonic()
+            arquivos = []
+            for raiz, _, nomes in os.walk(app.config['CACHE_SAIDA_DIR']):
+                for nome in nomes:
+                    if not nome.endswith('.pdf'):
+                        continue
+                    caminho = os.path.join(raiz, nome)
+                    with contextlib.suppress(OSError):
+                        estado = os.stat(caminho)
+                        arquivos.append((estado.st_mtime, estado.st_size, caminho))
+            total = sum(tamanho for _, tamanho, _ in arquivos)
+            if total > limite:
+                for _, tamanho, caminho in sorted(arquivos):
+                    if total <= limite * self.PODA_DISCO_ALVO:
+                        break
+                    with contextlib.suppress(FileNotFoundError):  # outro worker pode ter podado o mesmo arquivo
+                        os.remove(caminho)
+                        with self._lock:
+                            self.contadores['evictions_disco'] += 1
+                    total -= tamanho
+            self._bytes_disco = total
+
+    def _guardar_memoria(self, chave, conteudo):
+        limite = app.config['CACHE_SAIDA_MAX_BYTES']
+        if len(conteudo) > limite:
+            return
+        with self._lock:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                return
+            self._itens[chave] = conteudo
+            self._bytes += len(conteudo)
+            while self._bytes > limite:
+                _, removido = self._itens.popitem(last=False)
+                self._bytes -= len(removido)
+                self.contadores['evictions'] += 1
+
+    def estatisticas(self):
+        with self._lock:
+            return dict(self.contadores, itens=len(self._itens), bytes=self._bytes)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self._bytes = 0
+
+cache_saida = CacheSaida()
 
 # --- Helper Functions ---
-def generate_documents(dados, documentos_selecionados):
-    """Generate PDF documents based on form data and selected document types."""
-    generated_files = {}
-    idioma_principal = dados.get('idioma', 'Português')
-    
-    # Generate standard documents
+def planejar_documentos(registro, documentos_selecionados):
+    """
+    Lista (arquivo, função, argumentos extras) dos documentos selecionados,
+    na ordem em que devem aparecer na saída.
+    """
+    idioma_principal = registro.idioma_principal
     funcoes = {
         'capa': gerar_capa,
         'pagina_rosto': gerar_pagina_rosto,
         'ficha': gerar_ficha_catalografica,
         'contracapa': gerar_contracapa
     }
+    plano = [(f'{doc}.pdf', func, ()) for doc, func in funcoes.items() if doc in documentos_selecionados]
     
-    for doc, func in funcoes.items():
-        if doc in documentos_selecionados:
-            buffer = io.BytesIO()
-            func(dados, buffer)
-            buffer.seek(0)
-            generated_files[f'{doc}.pdf'] = buffer
-    
-    # Generate resumo/abstract
+    # Resumo/abstract trocam de gerador conforme o idioma principal
     if 'resumo' in documentos_selecionados:
-        buffer = io.BytesIO()
-        (gerar_resumo if idioma_principal == 'Português' else gerar_abstract)(dados, idioma_principal, buffer)
-        buffer.seek(0)
-        generated_files['resumo.pdf'] = buffer
-    
+        plano.append(('resumo.pdf', gerar_resumo if idioma_principal == 'Português' else gerar_abstract, (idioma_principal,)))
     if 'abstract' in documentos_selecionados:
-        buffer = io.BytesIO()
-        (gerar_abstract if idioma_principal == 'Português' else gerar_resumo)(dados, idioma_principal, buffer)
-        buffer.seek(0)
-        generated_files['abstract.pdf'] = buffer
+        plano.append(('abstract.pdf', gerar_abstract if idioma_principal == 'Português' else gerar_resumo, (idioma_principal,)))
+    return plano
+
+def renderizar_documento(func, registro, args):
+    """ Executa um gerador e devolve os bytes do PDF (função de topo, serializável para o pool de processos). """
+    buffer = io.BytesIO()
+    with metricas.medir('render', documento=func.__name__):
+        func(registro, *args, buffer)
+    return buffer.getvalue()
+
+_executores = {}
+_executores_lock = threading.Lock()
+
+def obter_executor(modo):
+    """ Pool de renderização do worker atual, criado sob demanda (após o fork do gunicorn). """
+    if modo not in ('thread', 'process'):
+        raise ValueError(f"Modo de renderização sem pool: {modo!r}")
+    with _executores_lock:
+        executor = _executores.get(modo)
+        if executor is None:
+            max_workers = app.config['RENDER_MAX_WORKERS']
+            if modo == 'process':
+                executor = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+            else:
+                executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='render')
+            _executores[modo] = executor
+        return executor
+
+def descartar_executor(modo):
+    with _executores_lock:
+        executor = _executores.pop(modo, None)
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def renderizar_em_paralelo(plano, registro, modo):
+    """
+    Renderiza os documentos do plano no pool configurado e entrega os bytes na ordem do plano,
+    à medida que ficam prontos. Se o pool estiver indisponível ou quebrar, o documento é gerado em série.
+    No timeout, os futuros ainda na fila são cancelados; uma renderização que já está rodando em
+    uma thread não pode ser interrompida e termina por conta própria (no modo 'process' também,
+    mas fora do processo do worker).
+    """
+    timeout = app.config['RENDER_TIMEOUT']
+    if modo not in ('thread', 'process'):
+        raise ValueError(f"Modo de renderização desconhecido: {modo!r} (use {', '.join(MODOS_RENDERIZACAO)})")
+    try:
+        executor = obter_executor(modo)
+        futuros = [executor.submit(renderizar_documento, func, registro, args) for _, func, args in plano]
+    except Exception as e:
+        app.logger.warning(f"Pool de renderização '{modo}' indisponível, gerando em série: {e}")
+        descartar_executor(modo)
+        for _, func, args in plano:
+            yield renderizar_documento(func, registro, args)
+        return
+    
+    try:
+        for (filename, func, args), futuro in zip(plano, futuros):
+            try:
+                conteudo = futuro.result(timeout=timeout)
+            except concurrent.futures.TimeoutError:
+                futuro.cancel()  # só tem efeito se ainda não começou (ver docstring)
+                raise TimeoutError(f"Tempo limite de {timeout:g}s excedido ao gerar {filename}")
+            except concurrent.futures.BrokenExecutor as e:
+                app.logger.warning(f"Pool de renderização '{modo}' falhou em {filename}, gerando em série: {e}")
+                descartar_executor(modo)
+                conteudo = renderizar_documento(func, registro, args)
+            yield conteudo
+    finally:
+        # Cliente desconectou, erro ou timeout: não deixa trabalho órfão no pool
+        for futuro in futuros: futuro.cancel()
+
+def _renderizar_plano(registro, plano, modo):
+    modo = modo or app.config['RENDER_EXECUTOR']
+    if modo == 'serial' or len(plano) < 2:
+        for filename, func, args in plano:
+            yield filename, renderizar_documento(func, registro, args)
+    else:
+        yield from zip((filename for filename, _, _ in plano), renderizar_em_paralelo(plano, registro, modo))
+
+def iterar_documentos(registro, plano, modo=None):
+    """
+    Gera pares (arquivo, bytes do PDF) na ordem do plano, um documento por vez.
+    Documentos já presentes no cache de saída não são renderizados novamente.
+    """
+    chaves = [chave_saida(registro, filename, func) for filename, func, _ in plano]
+    em_cache = [cache_saida.obter(chave) for chave in chaves]
+    renderizados = _renderizar_plano(registro, [item for item, conteudo in zip(plano, em_cache) if conteudo is None], modo)
+    
+    for (filename, _, _), chave, conteudo in zip(plano, chaves, em_cache):
+        if conteudo is None:
+            _, conteudo = next(renderizados)
+            cache_saida.guardar(chave, conteudo)
+        yield filename, conteudo
+
+def generate_documents(registro, documentos_selecionados, modo=None):
+    """Generate PDF documents based on form data and selected document types."""
+    plano = planejar_documentos(registro, documentos_selecionados)
+    return {filename: io.BytesIO(conteudo) for filename, conteudo in iterar_documentos(registro, plano, modo)}
+
+# --- PDF Único ---
+# Ordem institucional dos elementos pré-textuais no PDF único
+ORDEM_PDF_UNICO = ['capa', 'pagina_rosto', 'ficha', 'resumo', 'abstract', 'contracapa']
+
+def gerar_pdf_unico(registro, documentos_selecionados, buffer, marcadores=True):
+    """
+    Renderiza os documentos selecionados em um único PDF, na ordem institucional e em um
+    só canvas: fontes, formas das faixas e o logo são incorporados uma única vez.
+    """
+    idioma_principal = registro.idioma_principal
+    em_portugues = idioma_principal == 'Português'
+    c = novo_canvas(buffer, registro.perfil)
+    paginas = {
+        'capa': ("Capa", lambda: desenhar_capa(c, registro)),
+        'pagina_rosto': ("Página de rosto", lambda: desenhar_pagina_rosto(c, registro)),
+        'ficha': ("Ficha catalográfica", lambda: desenhar_ficha_catalografica(c, registro)),
+        'resumo': ("Resumo" if em_portugues else "Abstract", lambda: desenhar_historia(c, (historia_resumo if em_portugues else historia_abstract)(registro, idioma_principal))),
+        'abstract': ("Abstract" if em_portugues else "Resumo", lambda: desenhar_historia(c, (historia_abstract if em_portugues else historia_resumo)(registro, idioma_principal))),
+        'contracapa': ("Contracapa", lambda: desenhar_contracapa(c, registro.categoria)),
+    }
     
-    return generated_files
+    primeira = True
+    for documento in ORDEM_PDF_UNICO:
+        if documento not in documentos_selecionados: continue
+        if not primeira: c.showPage()
+        primeira = False
+        titulo, desenhar = paginas[documento]
+        if marcadores:
+            c.bookmarkPage(documento); c.addOutlineEntry(titulo, documento, level=0)
+        desenhar()
+    if marcadores: c.showOutline()
+    c.save()
+
+def renderizar_pdf_unico(registro, documentos_selecionados, marcadores=True):
+    """ Bytes do PDF único, reaproveitando o cache de saída quando nenhum documento mudou. """
+    plano = planejar_documentos(registro, documentos_selecionados)
+    partes = [chave_saida(registro, filename, func) for filename, func, _ in plano]
+    chave = hashlib.sha256(json.dumps(['pdf_unico', marcadores, partes]).encode('utf-8')).hexdigest()
+    conteudo = cache_saida.obter(chave)
+    if conteudo is None:
+        buffer = io.BytesIO()
+        gerar_pdf_unico(registro, documentos_selecionados, buffer, marcadores)
+        conteudo = buffer.getvalue()
+        cache_saida.guardar(chave, conteudo)
+    return conteudo
+
+# --- ZIP em Fluxo ---
+class _SaidaFluxo:
+    """ Destino não pesquisável para o ZipFile: acumula os bytes escritos até serem drenados. """
+    def __init__(self):
+        self._partes = []
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def drenar(self):
+        dados = b''.join(self._partes)
+        self._partes.clear()
+        return dados
+
+def compressao_zip(filename):
+    """ Método de compressão da entrada; PDFs já vêm comprimidos e por padrão são apenas armazenados. """
+    return app.config['ZIP_COMPRESSAO'].get(os.path.splitext(filename)[1].lower(), zipfile.ZIP_DEFLATED)
+
+def gerar_zip_em_fluxo(entradas):
+    """
+    Monta um ZIP a partir de pares (arquivo, bytes) e entrega cada entrada assim que é escrita.
+    A memória fica limitada à maior entrada, pois nada além dela é mantido entre os yields.
+    """
+    saida = _SaidaFluxo()
+    with zipfile.ZipFile(saida, 'w') as zf:
+        for filename, conteudo in entradas:
+            if not conteudo:
+                app.logger.error(f"File {filename} is empty")
+                raise ValueError(f"Generated file {filename} is empty")
+            with metricas.medir('zip'):
+                zf.writestr(filename, conteudo, compress_type=compressao_zip(filename))
+            yield saida.drenar()
+    # Diretório central, escrito ao fechar o arquivo
+    yield saida.drenar()
 
 # --- Helper Functions ---
+# Strict headers to prevent caching and ensure download
+CABECALHOS_DOWNLOAD = {
+    'Cache-Control': 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0',
+    'Pragma': 'no-cache',
+    'Expires': '0',
+}
+
 def send_file_response(file_obj, filename, mimetype):
     """Create a file download response with proper headers."""
     response = send_file(
@@ -367,18 +1456,306 @@ def send_file_response(file_obj, filename, mimetype):
         conditional=False
     )
     
-    # Set strict headers to prevent caching and ensure download
-    response.headers.update({
-        'Cache-Control': 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0',
-        'Pragma': 'no-cache',
-        'Expires': '0',
-        'Connection': 'close'
-    })
+    response.headers.update(CABECALHOS_DOWNLOAD)
     
     return response
 
+def stream_file_response(chunks, filename, mimetype):
+    """Create a chunked download response from an iterable of bytes."""
+    response = Response(chunks, mimetype=mimetype)
+    response.headers.set('Content-Disposition', 'attachment', filename=filename)
+    response.headers.update(CABECALHOS_DOWNLOAD)
+    return response
+
+# --- Limpeza e Validação dos Dados ---
+NOMES_AMIGAVEIS = {
+    "nome_citacao": "Nome do autor para citação",
+    "nome_completo": "Nome completo do autor",
+    "sobrenome": "Último sobrenome do autor",
+    "ano": "Ano de publicação",
+    "paginas": "Número de páginas",
+    "titulo": "Título do trabalho",
+    "idioma": "Idioma principal",
+    "versao": "Versão do trabalho",
+    "nivel": "Nível",
+    "area": "Área de concentração",
+    "licenca": "Licença",
+    "titulo_traduzido": "Título do trabalho traduzido"
+}
+
+def limpar_dados(dados):
+    """ Aplica clean_html_for_reportlab, no próprio dicionário, aos valores que contêm HTML. """
+    for key, value in dados.items():
+        if isinstance(value, str) and ('<' in value and '>' in value):
+            dados[key] = clean_html_for_reportlab(value)
+    return dados
+
+def _exigir_campo(campo, nome, registro, documentos_selecionados):
+    if not getattr(registro, campo):
+        return f"Erro: O campo '{nome}' é obrigatório para os documentos selecionados."
+
+def _exigir_orientador(registro, documentos_selecionados):
+    if not registro.orientador_tipo or not registro.orientador:
+        return "Erro: Os campos 'Título do Orientador' e 'Nome do Orientador' são obrigatórios."
+
+def _exigir_resumos(registro, documentos_selecionados):
+    if not registro.resumo or not registro.abstract:
+        return "Erro: Os campos 'Resumo' e 'Abstract' são obrigatórios."
+
+def _exigir_chaves(registro, documentos_selecionados):
+    if any(doc in documentos_selecionados for doc in ['resumo', 'abstract']):
+        if len(registro.chaves) < 3:
+            return "Erro: É obrigatório preencher pelo menos 3 Palavras-chave (PT)."
+        if len(registro.keywords) < 3:
+            return "Erro: É obrigatório preencher pelo menos 3 Keywords (EN)."
+    elif 'ficha' in documentos_selecionados:
+        if registro.idioma == 'Português' and len(registro.chaves) < 3:
+            return "Erro: Pelo menos 3 Palavras-chave (PT) são obrigatórias para a Ficha."
+        if registro.idioma == 'Inglês' and len(registro.keywords) < 3:
+            return "Erro: Pelo menos 3 Keywords (EN) são obrigatórias para a Ficha."
+
+# Regra de cada campo de CAMPOS_POR_DOCUMENTO, na ordem em que são conferidas: (campo, regra(registro, documentos) -> erro ou None)
+REGRAS_VALIDACAO = [(campo, functools.partial(_exigir_campo, campo, nome)) for campo, nome in NOMES_AMIGAVEIS.items()] + [
+    ('orientador_completo', _exigir_orientador),
+    ('resumos', _exigir_resumos),
+    ('chaves_keywords', _exigir_chaves),
+]
+
+# Estilo em que cada campo com marcação é desenhado (os demais usam 'Justificado')
+ESTILO_POR_CAMPO = {
+    'titulo': 'TituloCentro', 'subtitulo': 'TituloCentro', 'titulo_traduzido': 'AbstractCitacao', 'subtitulo_traduzido': 'AbstractCitacao',
+    'resumo': 'Corpo', 'abstract': 'Corpo', 'chaves': 'PalavrasChave', 'keywords': 'PalavrasChave',
+}
+
+NOMES_CAMPOS_MARCACAO = {
+    'subtitulo': "Subtítulo", 'subtitulo_traduzido': "Subtítulo traduzido", 'resumo': "Resumo", 'abstract': "Abstract",
+    'chaves': "Palavras-chave (PT)", 'keywords': "Keywords (EN)", 'bolsa': "Bolsa",
+}
+
+def validar_marcacao(registro, documentos_selecionados):
+    """
+    Monta um Paragraph de cada campo com marcação usado pelos documentos. O sanitizador deixa passar
+    valores que o ReportLab recusa (ex.: <font color="zz">); conferir aqui evita que o erro só apareça
+    no meio do ZIP em fluxo, depois que a resposta já começou.
+    """
+    for campo in sorted(set().union(*(campos_consumidos(doc) for doc in documentos_selecionados))):
+        valor = getattr(registro, campo)
+        if isinstance(valor, tuple):
+            valor = ", ".join(valor)
+        if '<' not in valor and '&' not in valor:
+            continue
+        try:
+            Paragraph(valor, ESTILOS[ESTILO_POR_CAMPO.get(campo, 'Justificado')])
+        except ValueError as e:
+            motivo = str(e).strip().splitlines()[-1].rsplit('caused exception ', 1)[-1]
+            nome = NOMES_AMIGAVEIS.get(campo) or NOMES_CAMPOS_MARCACAO.get(campo, campo)
+            return f"Erro: Marcação inválida no campo '{nome}': {motivo}"
+
+def validar_registro(registro, documentos_selecionados):
+    """
+    Confere, em uma única passada por REGRAS_VALIDACAO, os campos exigidos pelos documentos
+    selecionados (CAMPOS_POR_DOCUMENTO). Retorna a primeira mensagem de erro, ou None se o registro é válido.
+    """
+    if not documentos_selecionados:
+        return 'Erro: Você deve selecionar pelo menos um documento para gerar.'
+    desconhecidos = [doc for doc in documentos_selecionados if doc not in CAMPOS_POR_DOCUMENTO]
+    if desconhecidos:
+        return f"Erro: Documento desconhecido: {', '.join(map(str, desconhecidos))}. Use um de: {', '.join(CAMPOS_POR_DOCUMENTO)}."
+    if registro.perfil_saida not in PERFIS_SAIDA:
+        return f"Erro: Perfil de saída desconhecido: '{registro.perfil_saida}'. Use um de: {', '.join(PERFIS_SAIDA)}."
+
+    campos_necessarios = set().union(*(CAMPOS_POR_DOCUMENTO.get(doc, []) for doc in documentos_selecionados))
+    for campo, regra in REGRAS_VALIDACAO:
+        erro = regra(registro, documentos_selecionados) if campo in campos_necessarios else None
+        if erro:
+            return erro
+    return validar_marcacao(registro, documentos_selecionados)
+
+# --- Controle de Admissão ---
+class ControleAdmissao:
+    """
+    Limita as gerações simultâneas do processo (ADMISSAO_MAX_RENDERS). Pedidos excedentes esperam
+    em uma fila limitada (ADMISSAO_MAX_FILA) por até ADMISSAO_ESPERA_MAX segundos.
+    """
+    def __init__(self):
+        self._condicao = threading.Condition()
+        self.em_execucao = 0
+        self.na_fila = 0
+        self.contadores = collections.Counter()
+
+    def entrar(self):
+        """ Ocupa uma vaga; retorna False se a fila estiver cheia ou a espera se esgotar. """
+        limite = app.config['ADMISSAO_MAX_RENDERS']
+        with self._condicao:
+            if not limite or self.em_execucao < limite:
+                self.em_execucao += 1
+                self.contadores['admitidas'] += 1
+                return True
+            if self.na_fila >= app.config['ADMISSAO_MAX_FILA']:
+                self.contadores['rejeitadas_fila'] += 1
+                return False
+            self.na_fila += 1
+            self.contadores['enfileiradas'] += 1
+            try:
+                if not self._condicao.wait_for(lambda: self.em_execucao < limite, timeout=app.config['ADMISSAO_ESPERA_MAX']):
+                    self.contadores['rejeitadas_espera'] += 1
+                    return False
+            finally:
+                self.na_fila -= 1
+            self.em_execucao += 1
+            self.contadores['admitidas'] += 1
+            return True
+
+    def sair(self):
+        with self._condicao:
+            self.em_execucao -= 1
+            self._condicao.notify()
+
+    def limitada(self):
+        with self._condicao:
+            self.contadores['limitadas_taxa'] += 1
+
+    def estatisticas(self):
+        with self._condicao:
+            return dict(self.contadores, em_execucao=self.em_execucao, na_fila=self.na_fila)
+
+controle_admissao = ControleAdmissao()
+
+class BaldesMemoria:
+    """ Token buckets por cliente, em memória do processo. """
+    MAX_CLIENTES = 10000
+
+    def __init__(self):
+        self._baldes = {}
+        self._lock = threading.Lock()
+
+    def consumir(self, cliente, taxa, capacidade):
+        """ Retira uma ficha do balde do cliente; retorna 0 se permitido ou os segundos até a próxima ficha. """
+        agora = time.monotonic()
+        with self._lock:
+            fichas, atualizado, _ = self._baldes.get(cliente, (capacidade, agora, agora))
+            fichas = min(capacidade, fichas + (agora - atualizado) * taxa)
+            espera = 0 if fichas >= 1 else (1 - fichas) / taxa
+            fichas = fichas - 1 if not espera else fichas
+            self._baldes[cliente] = (fichas, agora, agora + (capacidade - fichas) / taxa)
+            if len(self._baldes) > self.MAX_CLIENTES:
+                # Baldes que já estariam cheios de novo não guardam informação: descarta
+                self._baldes = {c: balde for c, balde in self._baldes.items() if balde[2] > agora}
+            return espera
+
+def conexao_sqlite(local, caminho, esquema):
+    """
+    Conexão SQLite (autocommit, WAL) da thread atual, guardada em `local`; criada com o esquema no
+    primeiro uso. Uma por thread e por processo: conexões não atravessam o fork do gunicorn.
+    """
+    if getattr(local, 'pid', None) != os.getpid():
+        if os.path.dirname(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        conexao = sqlite3.connect(caminho, timeout=5, isolation_level=None)
+        conexao.execute("PRAGMA journal_mode=WAL")
+        conexao.executescript(esquema)
+        local.conexao, local.pid = conexao, os.getpid()
+    return local.conexao
+
+class BaldesSQLite:
+    """ Os mesmos token buckets em um arquivo SQLite, compartilhados pelos workers do gunicorn. """
+    ESQUEMA = "CREATE TABLE IF NOT EXISTS baldes (cliente TEXT PRIMARY KEY, fichas REAL NOT NULL, atualizado REAL NOT NULL, cheio_em REAL NOT NULL);"
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._local = threading.local()
+
+    def _conexao(self):
+        return conexao_sqlite(self._local, self.caminho, self.ESQUEMA)
+
+    def consumir(self, cliente, taxa, capacidade):
+        conexao = self._conexao()
+        agora = time.time()  # relógio comum a todos os processos
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            linha = conexao.execute("SELECT fichas, atualizado FROM baldes WHERE cliente = ?", (cliente,)).fetchone()
+            fichas, atualizado = linha if linha else (capacidade, agora)
+            fichas = min(capacidade, fichas + max(0.0, agora - atualizado) * taxa)
+            espera = 0 if fichas >= 1 else (1 - fichas) / taxa
+            fichas = fichas - 1 if not espera else fichas
+            conexao.execute("INSERT OR REPLACE INTO baldes (cliente, fichas, atualizado, cheio_em) VALUES (?, ?, ?, ?)", (cliente, fichas, agora, agora + (capacidade - fichas) / taxa))
+            conexao.execute("DELETE FROM baldes WHERE cheio_em < ?", (agora,))
+            conexao.execute("COMMIT")
+        except Exception:
+            conexao.execute("ROLLBACK")
+            raise
+        return espera
+
+_baldes = None
+_baldes_lock = threading.Lock()
+
+def obter_baldes():
+    """ Backend dos limites por cliente: SQLite compartilhado se LIMITE_SQLITE estiver definido, senão memória. """
+    global _baldes
+    with _baldes_lock:
+        if _baldes is None:
+            _baldes = BaldesSQLite(app.config['LIMITE_SQLITE']) if app.config['LIMITE_SQLITE'] else BaldesMemoria()
+        return _baldes
+
+def ip_cliente():
+    """
+    IP que identifica o cliente nos limites. O X-Forwarded-For é escrito em parte pelo próprio cliente:
+    só valem as entradas acrescentadas pelos LIMITE_CONFIAR_PROXY proxies próprios, contadas da direita.
+    """
+    saltos = app.config['LIMITE_CONFIAR_PROXY']
+    if saltos > 0:
+        encaminhados = [ip.strip() for ip in request.headers.get('X-Forwarded-For', '').split(',') if ip.strip()]
+        if len(encaminhados) >= saltos:
+            return encaminhados[-saltos]
+    return request.remote_addr or 'desconhecido'
+
+def recusar_requisicao(status, mensagem, retry_after):
+    """ 429/503 com Retry-After: o formulário volta com a mensagem; as rotas de API recebem JSON. """
+    if request.endpoint == 'formulario':
+        flash(mensagem, 'error')
+        resposta = make_response(render_template('formulario.html', dados=request.form.to_dict()), status)
+    else:
+        resposta = make_response(jsonify(erro=mensagem), status)
+    resposta.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return resposta
+
+def controlar_admissao(balde='LIMITE', limitar_concorrencia=True, metodos=('POST',)):
+    """
+    Decorador das rotas que geram documentos (só para os métodos dados): limite por IP (token bucket, 429) e
+    vaga no ControleAdmissao (503). A vaga só é liberada quando a resposta termina de ser enviada,
+    porque o ZIP em fluxo continua renderizando depois que a view retorna.
+    `balde` é o prefixo da configuração do limite (`<balde>_TAXA`, `<balde>_RAJADA`); cada prefixo tem
+    baldes próprios por IP.
+    """
+    def decorador(view):
+        @functools.wraps(view)
+        def envolvida(*args, **kwargs):
+            if request.method not in metodos:
+                return view(*args, **kwargs)
+            taxa = app.config[f'{balde}_TAXA']
+            if taxa > 0:
+                cliente = ip_cliente() if balde == 'LIMITE' else f"{balde}:{ip_cliente()}"
+                espera = obter_baldes().consumir(cliente, taxa, app.config[f'{balde}_RAJADA'])
+                if espera:
+                    controle_admissao.limitada()
+                    return recusar_requisicao(429, "Muitas requisições em pouco tempo. Aguarde alguns segundos e tente novamente.", espera)
+            if not limitar_concorrencia:
+                return view(*args, **kwargs)
+            if not controle_admissao.entrar():
+                return recusar_requisicao(503, "Servidor ocupado gerando outros documentos. Tente novamente em instantes.", app.config['ADMISSAO_RETRY_AFTER'])
+            try:
+                resposta = make_response(view(*args, **kwargs))
+            except Exception:
+                controle_admissao.sair()
+                raise
+            resposta.call_on_close(controle_admissao.sair)
+            return resposta
+        return envolvida
+    return decorador
+
 # --- Route Handler ---
 @app.route('/', methods=['GET', 'POST', 'HEAD'])
+@controlar_admissao()
 def formulario():
     """Main route handler for the form."""
     # Handle HEAD requests explicitly
@@ -392,110 +1769,52 @@ def formulario():
     # Handle POST request
     app.logger.info("Received POST request")
     app.logger.info(f"Content-Type: {request.content_type}")
-    app.logger.info(f"Form data: {request.form}")
+    if app.logger.isEnabledFor(logging.DEBUG):
+        app.logger.debug(f"Form data: {request.form}")
     
     try:
         # Get form data and selected documents
-        dados = request.form.to_dict()
-        documentos_selecionados = request.form.getlist('documentos')
+        with metricas.medir('parse'):
+            dados = request.form.to_dict()
+            documentos_selecionados = request.form.getlist('documentos')
         
-        # Clean HTML in form data
-        for key, value in dados.items():
-            if isinstance(value, str) and ('<' in value and '>' in value):
-                dados[key] = clean_html_for_reportlab(value)
-
-        # Validate document selection
-        if not documentos_selecionados:
-            flash('Erro: Você deve selecionar pelo menos um documento para gerar.', 'error')
-            return render_template('formulario.html', dados=dados)
+        # Clean HTML in form data and build the record used by every generator
+        with metricas.medir('limpeza'):
+            registro = RegistroTese.de_dados(limpar_dados(dados))
 
-        # Get required fields for selected documents
-        campos_necessarios_geral = set()
-        for doc in documentos_selecionados:
-            campos_necessarios_geral.update(CAMPOS_POR_DOCUMENTO.get(doc, []))
-
-        # Validate required fields
-        nomes_amigaveis = {
-            "nome_citacao": "Nome do autor para citação",
-            "nome_completo": "Nome completo do autor",
-            "sobrenome": "Último sobrenome do autor",
-            "ano": "Ano de publicação",
-            "paginas": "Número de páginas",
-            "titulo": "Título do trabalho",
-            "idioma": "Idioma principal",
-            "versao": "Versão do trabalho",
-            "nivel": "Nível",
-            "area": "Área de concentração",
-            "licenca": "Licença",
-            "titulo_traduzido": "Título do trabalho traduzido"
-        }
+        # Validate document selection and required fields
+        with metricas.medir('validacao'):
+            erro = validar_registro(registro, documentos_selecionados)
+        if erro:
+            flash(erro, 'error')
+            return render_template('formulario.html', dados=dados)
+        arquivar_registro(registro)
 
-        # Check basic required fields
-        for campo, nome in nomes_amigaveis.items():
-            if campo in campos_necessarios_geral and not dados.get(campo):
-                flash(f"Erro: O campo '{nome}' é obrigatório para os documentos selecionados.", 'error')
-                return render_template('formulario.html', dados=dados)
-
-        # Check advisor fields
-        if 'orientador_completo' in campos_necessarios_geral:
-            if not dados.get('orientador_tipo') or not dados.get('orientador'):
-                flash("Erro: Os campos 'Título do Orientador' e 'Nome do Orientador' são obrigatórios.", 'error')
-                return render_template('formulario.html', dados=dados)
-
-        # Check abstract fields
-        if 'resumos' in campos_necessarios_geral:
-            if not dados.get('resumo') or not dados.get('abstract'):
-                flash("Erro: Os campos 'Resumo' e 'Abstract' são obrigatórios.", 'error')
-                return render_template('formulario.html', dados=dados)
-
-        # Check keywords
-        if 'chaves_keywords' in campos_necessarios_geral:
-            chaves_pt = [v for k, v in dados.items() if k.startswith('chave') and v]
-            chaves_en = [v for k, v in dados.items() if k.startswith('keyword') and v]
-            
-            if any(doc in documentos_selecionados for doc in ['resumo', 'abstract']):
-                if len(chaves_pt) < 3:
-                    flash("Erro: É obrigatório preencher pelo menos 3 Palavras-chave (PT).", 'error')
-                    return render_template('formulario.html', dados=dados)
-                if len(chaves_en) < 3:
-                    flash("Erro: É obrigatório preencher pelo menos 3 Keywords (EN).", 'error')
-                    return render_template('formulario.html', dados=dados)
-            elif 'ficha' in documentos_selecionados:
-                if dados.get('idioma') == 'Português' and len(chaves_pt) < 3:
-                    flash("Erro: Pelo menos 3 Palavras-chave (PT) são obrigatórias para a Ficha.", 'error')
-                    return render_template('formulario.html', dados=dados)
-                if dados.get('idioma') == 'Inglês' and len(chaves_en) < 3:
-                    flash("Erro: Pelo menos 3 Keywords (EN) são obrigatórias para a Ficha.", 'error')
-                    return render_template('formulario.html', dados=dados)
-
-        app.logger.debug("Generating documents...")
-        generated_files = generate_documents(dados, documentos_selecionados)
-        app.logger.debug(f"Successfully generated {len(generated_files)} files")
+        # Handle single merged PDF output mode
+        if request.form.get('saida') == 'pdf_unico':
+            app.logger.debug("Generating single merged PDF")
+            conteudo = renderizar_pdf_unico(registro, documentos_selecionados, marcadores=bool(request.form.get('marcadores')))
+            return send_file_response(io.BytesIO(conteudo), 'documentos_ipen.pdf', 'application/pdf')
+        
+        plano = planejar_documentos(registro, documentos_selecionados)
         
-        # Handle response based on number of files
-        if len(generated_files) == 1:
+        # Handle single file
+        if len(plano) == 1:
+            app.logger.debug("Generating documents...")
+            generated_files = generate_documents(registro, documentos_selecionados)
             filename, buffer = list(generated_files.items())[0]
             buffer.seek(0)
             app.logger.debug(f"Sending single file: {filename}")
             return send_file_response(buffer, filename, 'application/pdf')
         
-        # Handle multiple files - create ZIP
-        app.logger.debug("Creating ZIP file")
-        memory_file = io.BytesIO()
-        
-        with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for filename, buffer in generated_files.items():
-                app.logger.debug(f"Adding {filename} to ZIP")
-                buffer.seek(0)
-                content = buffer.read()
-                if not content:
-                    app.logger.error(f"File {filename} is empty")
-                    raise ValueError(f"Generated file {filename} is empty")
-                zf.writestr(filename, content)
-        
-        memory_file.seek(0)
-        app.logger.debug("ZIP file created successfully")
-        return send_file_response(memory_file, 'documentos_ipen.zip', 'application/zip')
+        # Handle multiple files - stream ZIP entries as each document is rendered.
+        # O primeiro documento é gerado antes da resposta, para que erros comuns
+        # (ex.: marcação inválida no título) ainda voltem ao formulário com flash.
+        app.logger.debug("Streaming ZIP file")
+        documentos = iterar_documentos(registro, plano)
+        primeiro = next(documentos, None)
+        entradas = itertools.chain([primeiro] if primeiro else [], documentos)
+        return stream_file_response(gerar_zip_em_fluxo(entradas), 'documentos_ipen.zip', 'application/zip')
                 
     except Exception as e:
         app.logger.error(f"Error during form processing: {str(e)}")
@@ -506,10 +1825,682 @@ def formulario():
     # This return should never be reached because we handle all cases above
     return render_template('formulario.html', dados={}), 200
 
+# --- Prévia ao Vivo ---
+PREVIA_DPI_MAX = 150
+
+class CachePrevia:
+    """
+    Cache curto (PREVIA_TTL) e limitado em itens das prévias. A chave parte de chave_saida, que só
+    depende dos campos consumidos pelo documento: editar o resumo não invalida a prévia da capa.
+    """
+    def __init__(self):
+        self._itens = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave, renderizar):
+        agora = time.monotonic()
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None and item[0] > agora:
+                self._itens.move_to_end(chave)
+                return item[1]
+        conteudo = renderizar()
+        with self._lock:
+            self._itens[chave] = (agora + app.config['PREVIA_TTL'], conteudo)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > app.config['PREVIA_MAX_ITENS']:
+                self._itens.popitem(last=False)
+        return conteudo
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+cache_previas = CachePrevia()
+
+def rasterizar_pagina(pdf, pagina, dpi):
+    """
+    (PNG da página, total de páginas) usando PyMuPDF, dependência opcional;
+    retorna None se ela não estiver instalada (a prévia cai para o PDF).
+    """
+    try:
+        import pymupdf
+    except ImportError:
+        return None
+    with pymupdf.open(stream=pdf, filetype='pdf') as documento:
+        if not 1 <= pagina <= documento.page_count:
+            raise ValueError(f"Página {pagina} inexistente (o documento tem {documento.page_count}).")
+        with metricas.medir('rasterizacao'):
+            return documento[pagina - 1].get_pixmap(dpi=dpi).tobytes('png'), documento.page_count
+
+@app.route('/previa/<documento>', methods=['POST'])
+@controlar_admissao(balde='PREVIA_LIMITE')  # prévias seguem a digitação: balde próprio, mais folgado que o da geração
+def previa_documento(documento):
+    """Live preview: renders only the given document from the current form data, as PNG (one page) or PDF."""
+    if documento not in CAMPOS_POR_DOCUMENTO:
+        return jsonify(erro=f"Documento desconhecido: {documento}"), 404
+    try:
+        pagina = int(request.args.get('pagina', 1))
+        dpi = max(18, min(int(request.args.get('dpi', app.config['PREVIA_DPI'])), PREVIA_DPI_MAX))
+    except ValueError:
+        return jsonify(erro="Os parâmetros 'pagina' e 'dpi' devem ser inteiros."), 400
+    
+    # Sem validação de obrigatórios: a prévia mostra o documento como está, enquanto o formulário é preenchido
+    registro = RegistroTese.de_dados(limpar_dados(request.form.to_dict()))
+    (filename, func, args), = planejar_documentos(registro, [documento])
+    chave = chave_saida(registro, filename, func)
+    try:
+        pdf = cache_previas.obter((chave, 'pdf'), lambda: renderizar_documento(func, registro, args))
+        if request.args.get('formato', 'png') == 'png':
+            imagem = cache_previas.obter((chave, 'png', pagina, dpi), lambda: rasterizar_pagina(pdf, pagina, dpi))
+            if imagem is not None:
+                resposta = Response(imagem[0], mimetype='image/png')
+                resposta.headers['X-Previa-Paginas'] = str(imagem[1])
+                return resposta
+    except (ValueError, LayoutError) as e:
+        # Marcação inválida no meio da digitação (ex.: tag aberta) não é erro do servidor
+        return jsonify(erro=str(e)), 422
+    return Response(pdf, mimetype='application/pdf')
+
+# --- Geração em Lote ---
+def ler_registros_lote():
+    """
+    Lê os registros do lote: arquivo enviado no campo 'arquivo' (CSV ou JSON) ou corpo JSON.
+    O JSON pode ser uma lista de registros ou {"documentos": [...], "registros": [...]}.
+    Retorna (registros, documentos padrão para registros que não definem 'documentos').
+    """
+    documentos_padrao = request.form.getlist('documentos') or request.args.getlist('documentos')
+    arquivo = request.files.get('arquivo')
+    if arquivo:
+        conteudo = arquivo.read().decode('utf-8-sig')
+        if (arquivo.filename or '').lower().endswith('.csv') or arquivo.mimetype == 'text/csv':
+            try:
+                dialeto = csv.Sniffer().sniff(conteudo.split('\n', 1)[0], delimiters=',;\t')
+            except csv.Error:
+                dialeto = csv.excel
+            return list(csv.DictReader(io.StringIO(conteudo), dialect=dialeto)), documentos_padrao
+        carga = json.loads(conteudo)
+    else:
+        carga = request.get_json(silent=True)
+        if carga is None:
+            raise ValueError("Envie um arquivo CSV/JSON no campo 'arquivo' ou um corpo JSON.")
+    
+    if isinstance(carga, dict):
+        documentos_padrao = carga.get('documentos') or documentos_padrao
+        carga = carga.get('registros')
+    if not isinstance(carga, list) or not all(isinstance(r, dict) for r in carga):
+        raise ValueError("O lote deve ser uma lista de registros.")
+    return carga, documentos_padrao
+
+def normalizar_registro(registro, documentos_padrao):
+    """
+    Converte um registro do lote no mesmo formato de request.form (valores str, HTML limpo) e monta o RegistroTese.
+    ValueError se 'documentos' não for um texto ou uma lista de textos.
+    """
+    documentos = registro.get('documentos') or documentos_padrao
+    if isinstance(documentos, str):
+        documentos = re.split(r'[\s|;,]+', documentos.strip())
+    if not isinstance(documentos, list) or not all(isinstance(d, str) for d in documentos):
+        raise ValueError("'documentos' deve ser uma lista de nomes de documentos.")
+    dados = {str(k): '' if v is None else str(v) for k, v in registro.items() if k and k != 'documentos'}
+    return RegistroTese.de_dados(limpar_dados(dados)), [d for d in documentos if d]
+
+def nome_pasta_registro(indice, tese):
+    """ Pasta do registro dentro do ZIP: índice + nome do autor em ASCII. """
+    nome = unicodedata.normalize('NFKD', f"{tese.sobrenome} {tese.nome_completo}")
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', nome.encode('ascii', 'ignore').decode()).strip('_')
+    return f"{indice:03d}_{slug or 'registro'}"
+
+def gerar_entradas_lote(registros, preparar, arquivar=True):
+    """
+    Prepara (preparar(registro) -> (RegistroTese, documentos)), valida e renderiza cada registro,
+    entregando pares (caminho no ZIP, bytes). Registros com erro, inclusive de formato, não
+    interrompem o lote; o resultado de cada um vai para relatorio.json.
+    Com `arquivar`, os registros válidos são guardados no acervo.
+    """
+    relatorio = []
+    for indice, registro in enumerate(registros, 1):
+        item = {'registro': indice, 'pasta': f"{indice:03d}_registro"}
+        arquivos = []
+        try:
+            tese, documentos = preparar(registro)
+        except (ValueError, TypeError) as e:
+            tese, erro = None, f"Erro: Registro inválido: {str(e)}"
+        if tese is not None:
+            item['pasta'] = nome_pasta_registro(indice, tese)
+            erro = validar_registro(tese, documentos)
+        if not erro:
+            id_acervo = arquivar_registro(tese) if arquivar else None
+            if id_acervo is not None:
+                item['acervo_id'] = id_acervo
+            try:
+                arquivos = list(iterar_documentos(tese, planejar_documentos(tese, documentos)))
+            except Exception as e:
+                app.logger.error(f"Error rendering batch record {indice}: {str(e)}")
+                erro = f"Erro ao gerar documentos: {str(e)}"
+        if erro:
+            item.update(status='erro', erro=erro)
+        else:
+            item.update(status='ok', documentos=[filename for filename, _ in arquivos])
+            for filename, conteudo in arquivos:
+                yield f"{item['pasta']}/{filename}", conteudo
+        relatorio.append(item)
+    
+    resumo = {
+        'total': len(relatorio),
+        'sucesso': sum(1 for item in relatorio if item['status'] == 'ok'),
+        'erros': sum(1 for item in relatorio if item['status'] == 'erro'),
+        'registros': relatorio,
+    }
+    yield 'relatorio.json', json.dumps(resumo, ensure_ascii=False, indent=2).encode('utf-8')
+
+@app.route('/lote', methods=['POST'])
+@controlar_admissao()
+def gerar_lote():
+    """Batch route: CSV/JSON records in, ZIP with one folder per record plus relatorio.json out."""
+    try:
+        registros, documentos_padrao = ler_registros_lote()
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify(erro=f"Lote inválido: {str(e)}"), 400
+    
+    if not registros:
+        return jsonify(erro="Lote vazio."), 400
+    if len(registros) > app.config['LOTE_MAX_REGISTROS']:
+        return jsonify(erro=f"O lote excede o limite de {app.config['LOTE_MAX_REGISTROS']} registros."), 400
+    
+    app.logger.info(f"Generating batch of {len(registros)} records")
+    preparar = functools.partial(normalizar_registro, documentos_padrao=documentos_padrao)
+    return stream_file_response(gerar_zip_em_fluxo(gerar_entradas_lote(registros, preparar)), 'lote_ipen.zip', 'application/zip')
+
+# --- Fila de Trabalhos Assíncronos ---
+class Trabalho:
+    """ Uma geração assíncrona: progresso por documento e, ao final, o arquivo pronto para um único download. """
+    def __init__(self, plano=(), estado=None):
+        estado = estado or {
+            'id': uuid.uuid4().hex, 'criado': time.time(), 'concluido': None, 'estado': 'pendente',
+            'documentos': {filename: 'pendente' for filename, _, _ in plano}, 'erro': None, 'nome': None, 'mimetype': None,
+        }
+        self.id = estado['id']
+        self.criado = estado['criado']
+        self.concluido = estado['concluido']  # time.time() ao terminar (com sucesso ou erro): o TTL conta daqui
+        self.estado = estado['estado']
+        self.documentos = estado['documentos']
+        self.erro = estado['erro']
+        self.nome = estado['nome']
+        self.mimetype = estado['mimetype']
+        self.conteudo = None
+
+    def para_estado(self):
+        return {campo: getattr(self, campo) for campo in ('id', 'criado', 'concluido', 'estado', 'documentos', 'erro', 'nome', 'mimetype')}
+
+    def status(self):
+        prontos = sum(1 for estado in self.documentos.values() if estado == 'pronto')
+        return {
+            'id': self.id,
+            'estado': self.estado,
+            'documentos': dict(self.documentos),
+            'progresso': f"{prontos}/{len(self.documentos)}",
+            'erro': self.erro,
+        }
+
+class FilaTrabalhos:
+    """
+    Fila sem broker externo: os trabalhos rodam em um pool de threads do worker que os recebeu, mas
+    estado e resultado ficam em arquivos em TRABALHOS_DIR, visíveis a todos os workers do gunicorn
+    (a consulta e o download podem cair em outro worker). Resultados expiram TRABALHOS_TTL segundos
+    depois de concluídos; trabalhos que nunca terminam (worker morto) expiram contando da criação.
+    """
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _obter_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=app.config['TRABALHOS_MAX_WORKERS'], thread_name_prefix='trabalho')
+            return self._executor
+
+    def _caminho(self, id_trabalho, extensao):
+        diretorio = app.config['TRABALHOS_DIR']
+        os.makedirs(diretorio, exist_ok=True)
+        return os.path.join(diretorio, f"{id_trabalho}.{extensao}")
+
+    def _salvar(self, trabalho):
+        gravar_atomico(self._caminho(trabalho.id, 'json'), json.dumps(trabalho.para_estado()).encode('utf-8'))
+
+    def _ler(self, id_trabalho):
+        # O id vem da URL: só nomes gerados por uuid4().hex chegam ao sistema de arquivos
+        if not re.fullmatch(r'[0-9a-f]{32}', id_trabalho):
+            return None
+        try:
+            with open(self._caminho(id_trabalho, 'json'), 'rb') as f:
+                return Trabalho(estado=json.loads(f.read()))
+        except (OSError, ValueError):
+            return None
+
+    def _remover(self, id_trabalho):
+        for extensao in ('bin', 'json'):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._caminho(id_trabalho, extensao))
+
+    def expirar(self):
+        """ Remove os trabalhos vencidos e retorna quantos continuam ativos (em todos os workers). """
+        agora, ttl, ativos = time.time(), app.config['TRABALHOS_TTL'], 0
+        for nome in os.listdir(os.path.dirname(self._caminho('x', 'json'))):
+            if not nome.endswith('.json'):
+                continue
+            trabalho = self._ler(nome[:-5])
+            if trabalho is None:
+                continue
+            if (trabalho.concluido or trabalho.criado) < agora - ttl:
+                self._remover(trabalho.id)
+            else:
+                ativos += 1
+        return ativos
+
+    def enviar(self, registro, plano):
+        """ Enfileira a geração; retorna o Trabalho ou None se a fila estiver cheia. """
+        if self.expirar() >= app.config['TRABALHOS_MAX_ATIVOS']:
+            return None
+        trabalho = Trabalho(plano)
+        self._salvar(trabalho)
+        self._obter_executor().submit(self._executar, trabalho, registro, plano)
+        return trabalho
+
+    def _executar(self, trabalho, registro, plano):
+        trabalho.estado = 'executando'
+        self._salvar(trabalho)
+        try:
+            arquivos = []
+            for filename, conteudo in iterar_documentos(registro, plano):
+                arquivos.append((filename, conteudo))
+                trabalho.documentos[filename] = 'pronto'
+                self._salvar(trabalho)
+            if len(arquivos) == 1:
+                trabalho.nome, conteudo = arquivos[0]
+                trabalho.mimetype = 'application/pdf'
+            else:
+                trabalho.nome, trabalho.mimetype = 'documentos_ipen.zip', 'application/zip'
+                conteudo = b''.join(gerar_zip_em_fluxo(arquivos))
+            gravar_atomico(self._caminho(trabalho.id, 'bin'), conteudo)
+            trabalho.estado = 'concluido'
+        except Exception as e:
+            app.logger.error(f"Error in job {trabalho.id}: {str(e)}")
+            trabalho.erro = str(e)
+            trabalho.estado = 'erro'
+        trabalho.concluido = time.time()
+        self._salvar(trabalho)
+
+    def obter(self, id_trabalho):
+        self.expirar()
+        return self._ler(id_trabalho)
+
+    def retirar(self, id_trabalho):
+        """ Remove e retorna um trabalho concluído; o resultado só pode ser baixado uma vez. """
+        trabalho = self._ler(id_trabalho)
+        if trabalho is None or trabalho.estado != 'concluido':
+            return None
+        # Renomear é atômico: entre pedidos simultâneos (mesmo em workers diferentes), só um fica com o arquivo
+        resultado = self._caminho(id_trabalho, 'bin')
+        retirado = f"{resultado}.{os.getpid()}.{threading.get_ident()}.retirado"
+        try:
+            os.replace(resultado, retirado)
+        except FileNotFoundError:
+            return None
+        try:
+            with open(retirado, 'rb') as f:
+                trabalho.conteudo = f.read()
+        finally:
+            os.remove(retirado)
+            self._remover(id_trabalho)
+        return trabalho
+
+fila_trabalhos = FilaTrabalhos()
+
+@app.route('/trabalhos', methods=['POST'])
+@controlar_admissao(limitar_concorrencia=False)  # a renderização já é limitada pelo pool da fila
+def criar_trabalho():
+    """Async route: validates the form data, queues the generation and returns the job id."""
+    registro = RegistroTese.de_dados(limpar_dados(request.form.to_dict()))
+    documentos_selecionados = request.form.getlist('documentos')
+    erro = validar_registro(registro, documentos_selecionados)
+    if erro:
+        return jsonify(erro=erro), 400
+    
+    trabalho = fila_trabalhos.enviar(registro, planejar_documentos(registro, documentos_selecionados))
+    if trabalho is None:
+        return jsonify(erro="Fila de geração cheia. Tente novamente em instantes."), 503
+    
+    resposta = trabalho.status()
+    resposta.update(acervo_id=arquivar_registro(registro), status_url=url_for('status_trabalho', id_trabalho=trabalho.id), download_url=url_for('baixar_trabalho', id_trabalho=trabalho.id))
+    return jsonify(resposta), 202
+
+@app.route('/trabalhos/<id_trabalho>', methods=['GET'])
+def status_trabalho(id_trabalho):
+    trabalho = fila_trabalhos.obter(id_trabalho)
+    if trabalho is None:
+        return jsonify(erro="Trabalho não encontrado ou expirado."), 404
+    return jsonify(trabalho.status())
+
+@app.route('/trabalhos/<id_trabalho>/download', methods=['GET'])
+def baixar_trabalho(id_trabalho):
+    trabalho = fila_trabalhos.retirar(id_trabalho)
+    if trabalho is None:
+        existente = fila_trabalhos.obter(id_trabalho)
+        if existente is None:
+            return jsonify(erro="Trabalho não encontrado, expirado ou já baixado."), 404
+        return jsonify(existente.status()), 409
+    return send_file_response(io.BytesIO(trabalho.conteudo), trabalho.nome, trabalho.mimetype)
+
+# --- Acervo de Trabalhos ---
+ESQUEMA_ACERVO = """
+CREATE TABLE IF NOT EXISTS trabalhos (
+    id INTEGER PRIMARY KEY,
+    chave TEXT NOT NULL UNIQUE,  -- sha256 dos dados: reenvios idênticos não duplicam
+    dados TEXT NOT NULL,         -- JSON no formato de request.form (RegistroTese.para_dados)
+    autor TEXT NOT NULL,         -- colunas de filtro, já normalizadas (normalizar_busca)
+    titulo TEXT NOT NULL,
+    ano TEXT NOT NULL,
+    categoria TEXT NOT NULL,
+    criado REAL NOT NULL,
+    atualizado REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_trabalhos_autor ON trabalhos (autor);
+CREATE INDEX IF NOT EXISTS idx_trabalhos_titulo ON trabalhos (titulo);
+CREATE INDEX IF NOT EXISTS idx_trabalhos_ano ON trabalhos (ano);
+CREATE INDEX IF NOT EXISTS idx_trabalhos_categoria_ano ON trabalhos (categoria, ano);
+CREATE INDEX IF NOT EXISTS idx_trabalhos_atualizado ON trabalhos (atualizado);
+CREATE VIRTUAL TABLE IF NOT EXISTS trabalhos_busca USING fts5(titulo, titulo_traduzido, chaves, keywords, tokenize='unicode61 remove_diacritics 2');
+"""
+ACERVO_LIMITE_MAX = 200
+
+def texto_simples(texto):
+    """ Texto sem a marcação do ReportLab (tags e entidades). """
+    return ' '.join(html.unescape(re.sub(r'<[^>]*>', ' ', texto)).split())
+
+def normalizar_busca(texto):
+    """ Texto simples, sem acentos e em minúsculas: a forma das colunas de filtro e dos valores comparados a elas. """
+    decomposto = unicodedata.normalize('NFKD', texto_simples(texto))
+    return ''.join(ch for ch in decomposto if not unicodedata.combining(ch)).lower()
+
+class Acervo:
+    """
+    Registros já validados, em SQLite (ACERVO_DB), para gerar os documentos de novo sem preencher
+    o formulário. Filtros por autor e título (prefixo), ano e categoria usam índices comuns;
+    a busca textual em títulos e palavras-chave usa FTS5, sem distinção de acentos.
+    """
+    COLUNAS = "t.id, t.dados, t.criado, t.atualizado"
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def ativo(self):
+        return bool(app.config['ACERVO_DB'])
+
+    def _conexao(self):
+        return conexao_sqlite(self._local, app.config['ACERVO_DB'], ESQUEMA_ACERVO)
+
+    def guardar(self, registro):
+        """ Insere o registro (ou só atualiza a data, se já existir) e retorna o id. """
+        dados = json.dumps(registro.para_dados(), sort_keys=True, ensure_ascii=False)
+        chave = hashlib.sha256(dados.encode('utf-8')).hexdigest()
+        agora = time.time()
+        conexao = self._conexao()
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            linha = conexao.execute("SELECT id FROM trabalhos WHERE chave = ?", (chave,)).fetchone()
+            if linha:
+                id_registro = linha[0]
+                conexao.execute("UPDATE trabalhos SET atualizado = ? WHERE id = ?", (agora, id_registro))
+            else:
+                id_registro = conexao.execute(
+                    "INSERT INTO trabalhos (chave, dados, autor, titulo, ano, categoria, criado, atualizado) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (chave, dados, normalizar_busca(f"{registro.sobrenome} {registro.nome_completo}"), normalizar_busca(registro.titulo_completo),
+                     registro.ano, registro.categoria, agora, agora),
+                ).lastrowid
+                titulo_traduzido = registro.titulo_traduzido + (f": {registro.subtitulo_traduzido}" if registro.subtitulo_traduzido else "")
+                conexao.execute(
+                    "INSERT INTO trabalhos_busca (rowid, titulo, titulo_traduzido, chaves, keywords) VALUES (?, ?, ?, ?, ?)",
+                    (id_registro, texto_simples(registro.titulo_completo), texto_simples(titulo_traduzido), ' '.join(registro.chaves), ' '.join(registro.keywords)),
+                )
+            conexao.execute("COMMIT")
+        except Exception:
+            conexao.execute("ROLLBACK")
+            raise
+        return id_registro
+
+    def _item(self, linha):
+        id_registro, dados, criado, atualizado = linha
+        return {'id': id_registro, 'dados': json.loads(dados), 'criado': criado, 'atualizado': atualizado}
+
+    def obter(self, id_registro):
+        linha = self._conexao().execute(f"SELECT {self.COLUNAS} FROM trabalhos t WHERE t.id = ?", (id_registro,)).fetchone()
+        return self._item(linha) if linha else None
+
+    def buscar(self, texto=None, autor=None, titulo=None, ano=None, categoria=None, limite=50, deslocamento=0):
+        """
+        Registros que atendem a todos os filtros dados: `texto` em títulos e palavras-chave (ordenado
+        por relevância), `autor` ("sobrenome nome") e `titulo` por prefixo, `ano` e `categoria` exatos.
+        Sem busca textual, os mais recentes primeiro.
+        """
+        juncao, condicoes, parametros, ordem = "", [], [], "t.atualizado DESC"
+        termos = re.findall(r'\w+', texto or '')
+        if termos:
+            juncao, ordem = "JOIN trabalhos_busca b ON b.rowid = t.id", "b.rank"
+            condicoes.append("trabalhos_busca MATCH ?")
+            parametros.append(' '.join(f'"{termo}"*' for termo in termos))
+        for coluna, valor in (('autor', autor), ('titulo', titulo)):
+            if valor:
+                # Intervalo [prefixo, prefixo + maior caractere): busca por prefixo que usa o índice
+                prefixo = normalizar_busca(valor)
+                condicoes.append(f"t.{coluna} >= ? AND t.{coluna} < ?")
+                parametros.extend([prefixo, prefixo + '\U0010ffff'])
+        for coluna, valor in (('ano', ano), ('categoria', categoria)):
+            if valor:
+                condicoes.append(f"t.{coluna} = ?")
+                parametros.append(valor)
+        onde = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        consulta = f"SELECT {self.COLUNAS} FROM trabalhos t {juncao} {onde} ORDER BY {ordem} LIMIT ? OFFSET ?"
+        return [self._item(linha) for linha in self._conexao().execute(consulta, (*parametros, limite, deslocamento))]
+
+acervo = Acervo()
+
+def arquivar_registro(registro):
+    """ Guarda um registro validado no acervo e retorna o id; falhas vão para o log e não impedem a geração. """
+    if not acervo.ativo:
+        return None
+    try:
+        with metricas.medir('acervo'):
+            return acervo.guardar(registro)
+    except (sqlite3.Error, OSError) as e:
+        app.logger.warning(f"Não foi possível guardar o registro no acervo: {e}")
+        return None
+
+def exigir_token_acervo(view):
+    """
+    Decorador das rotas /acervo: os registros têm dados pessoais e ids sequenciais, então só respondem
+    com 'Authorization: Bearer <ACERVO_TOKEN>'. Sem token configurado, as rotas ficam bloqueadas.
+    """
+    @functools.wraps(view)
+    def envolvida(*args, **kwargs):
+        if not acervo.ativo:
+            return jsonify(erro="Acervo desativado (ACERVO_DB)."), 404
+        token = app.config['ACERVO_TOKEN']
+        if not token:
+            return jsonify(erro="Consulta ao acervo desativada (ACERVO_TOKEN)."), 403
+        esquema, _, enviado = request.headers.get('Authorization', '').partition(' ')
+        if esquema.lower() != 'bearer' or not hmac.compare_digest(enviado.strip().encode('utf-8'), token.encode('utf-8')):
+            resposta = jsonify(erro="Token de acesso ao acervo ausente ou inválido.")
+            resposta.status_code = 401
+            resposta.headers['WWW-Authenticate'] = 'Bearer'
+            return resposta
+        return view(*args, **kwargs)
+    return envolvida
+
+def filtros_acervo(valores):
+    """ Argumentos de Acervo.buscar a partir de query string/JSON: q, autor, titulo, ano, nivel (texto do formulário ou categoria). """
+    for campo in ('q', 'autor', 'titulo', 'nivel'):
+        if valores.get(campo) is not None and not isinstance(valores[campo], str):
+            raise ValueError(f"O filtro '{campo}' deve ser um texto.")
+    ano = valores.get('ano')
+    if ano is not None and (isinstance(ano, bool) or not isinstance(ano, (str, int))):
+        raise ValueError("O filtro 'ano' deve ser um texto ou um inteiro.")
+    nivel = valores.get('nivel')
+    return {
+        'texto': valores.get('q'), 'autor': valores.get('autor'), 'titulo': valores.get('titulo'),
+        'ano': str(valores['ano']) if valores.get('ano') else None, 'categoria': categoria_nivel(nivel) if nivel else None,
+    }
+
+def resumo_acervo(item):
+    dados = item['dados']
+    return {
+        'id': item['id'],
+        'autor': f"{dados.get('nome_completo', '')} {dados.get('sobrenome', '')}".strip(),
+        'titulo': texto_simples(dados.get('titulo', '')),
+        'ano': dados.get('ano', ''),
+        'nivel': dados.get('nivel', ''),
+        'criado': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(item['criado'])),
+        'atualizado': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(item['atualizado'])),
+        'url': url_for('ver_registro_acervo', id_registro=item['id']),
+    }
+
+@app.route('/acervo', methods=['GET'])
+@exigir_token_acervo
+def buscar_acervo():
+    """Searches stored records: q (full text over titles/keywords), autor and titulo (prefix), ano, nivel, limite, pagina."""
+    try:
+        limite = max(1, min(int(request.args.get('limite', 50)), ACERVO_LIMITE_MAX))
+        pagina = max(1, int(request.args.get('pagina', 1)))
+    except ValueError:
+        return jsonify(erro="Os parâmetros 'limite' e 'pagina' devem ser inteiros."), 400
+    itens = acervo.buscar(**filtros_acervo(request.args), limite=limite, deslocamento=(pagina - 1) * limite)
+    return jsonify(registros=[resumo_acervo(item) for item in itens], pagina=pagina, limite=limite)
+
+@app.route('/acervo/<int:id_registro>', methods=['GET'])
+@exigir_token_acervo
+def ver_registro_acervo(id_registro):
+    """Stored record: form data plus one regeneration URL per document."""
+    item = acervo.obter(id_registro)
+    if item is None:
+        return jsonify(erro="Registro não encontrado no acervo."), 404
+    resposta = resumo_acervo(item)
+    resposta.update(dados=item['dados'], documentos={doc: url_for('regenerar_documento', id_registro=id_registro, documento=doc) for doc in CAMPOS_POR_DOCUMENTO})
+    return jsonify(resposta)
+
+@app.route('/acervo/<int:id_registro>/<documento>', methods=['GET', 'POST'])
+@exigir_token_acervo
+@controlar_admissao(metodos=('GET', 'POST'))
+def regenerar_documento(id_registro, documento):
+    """Regenerates one document of a stored record; served from the output cache while the generator version matches."""
+    if documento not in CAMPOS_POR_DOCUMENTO:
+        return jsonify(erro=f"Documento desconhecido: {documento}"), 404
+    item = acervo.obter(id_registro)
+    if item is None:
+        return jsonify(erro="Registro não encontrado no acervo."), 404
+    
+    registro = RegistroTese.de_dados(dict(item['dados'], perfil_saida=request.values.get('perfil_saida', '')))
+    # O registro foi validado para os documentos pedidos na época; outro documento pode exigir mais campos
+    erro = validar_registro(registro, [documento])
+    if erro:
+        return jsonify(erro=erro), 422
+    (filename, conteudo), = iterar_documentos(registro, planejar_documentos(registro, [documento]))
+    return send_file_response(io.BytesIO(conteudo), filename, 'application/pdf')
+
+@app.route('/acervo/lote', methods=['POST'])
+@exigir_token_acervo
+@controlar_admissao()
+def regenerar_lote_acervo():
+    """Bulk re-issue: 'ids' (or the /acervo filters) and 'documentos' (default: ficha) in, ZIP with one folder per record out."""
+    carga = request.get_json(silent=True)
+    if not isinstance(carga, dict):
+        carga = request.form.to_dict()
+        carga['ids'] = [int(i) if i.strip().isdigit() else i for i in request.form.getlist('ids')]
+        carga['documentos'] = request.form.getlist('documentos')
+    
+    # Strings também são iteráveis: "ficha" ou "12" não podem virar listas de caracteres
+    ids, documentos, perfil = carga.get('ids'), carga.get('documentos') or ['ficha'], carga.get('perfil_saida') or ''
+    if ids is not None and not (isinstance(ids, list) and all(isinstance(i, int) and not isinstance(i, bool) for i in ids)):
+        return jsonify(erro="'ids' deve ser uma lista de inteiros."), 400
+    if not (isinstance(documentos, list) and all(isinstance(d, str) and d in CAMPOS_POR_DOCUMENTO for d in documentos)):
+        return jsonify(erro=f"'documentos' deve ser uma lista com nomes entre: {', '.join(CAMPOS_POR_DOCUMENTO)}."), 400
+    if not isinstance(perfil, str):
+        return jsonify(erro="'perfil_saida' deve ser um texto."), 400
+    
+    if ids:
+        itens = [acervo.obter(i) for i in ids]
+        ausentes = [i for i, item in zip(ids, itens) if item is None]
+        if ausentes:
+            return jsonify(erro=f"Registros não encontrados no acervo: {', '.join(map(str, ausentes))}"), 404
+    else:
+        try:
+            filtros = filtros_acervo(carga)
+        except ValueError as e:
+            return jsonify(erro=str(e)), 400
+        if not any(filtros.values()):
+            return jsonify(erro="Informe 'ids' ou ao menos um filtro (q, autor, titulo, ano, nivel)."), 400
+        itens = acervo.buscar(**filtros, limite=app.config['LOTE_MAX_REGISTROS'] + 1)
+    
+    if not itens:
+        return jsonify(erro="Nenhum registro encontrado."), 404
+    if len(itens) > app.config['LOTE_MAX_REGISTROS']:
+        return jsonify(erro=f"A seleção excede o limite de {app.config['LOTE_MAX_REGISTROS']} registros."), 400
+    
+    preparar = lambda item: (RegistroTese.de_dados(dict(item['dados'], perfil_saida=perfil)), documentos)
+    return stream_file_response(gerar_zip_em_fluxo(gerar_entradas_lote(itens, preparar, arquivar=False)), 'acervo_ipen.zip', 'application/zip')
+
 @app.errorhandler(Exception)
 def handle_error(e):
     app.logger.error(f"Unexpected error: {str(e)}")
     return str(e), 500
 
+# --- Aquecimento (pré-fork) ---
+# Dados fictícios que exercitam todos os geradores (campos compostos, HTML, resumo/abstract)
+DADOS_AQUECIMENTO = {
+    'idioma': 'Português', 'versao': 'Versão Corrigida', 'nivel': 'Dissertação (Mestrado)', 'area': 'Tecnologia Nuclear - Materiais',
+    'licenca': 'CC-BY-NC 4.0', 'nome_citacao': 'Silva, Ana', 'nome_completo': 'Ana', 'sobrenome': 'Silva', 'ano': '2025', 'paginas': '100',
+    'titulo': '<p>Título de <b>aquecimento</b></p>', 'subtitulo': '', 'titulo_traduzido': 'Warm-up title',
+    'orientador_tipo': 'Prof. Dr.', 'orientador': 'Orientador', 'chave1': 'a', 'chave2': 'b', 'chave3': 'c',
+    'keyword1': 'x', 'keyword2': 'y', 'keyword3': 'z', 'resumo': '<div>Resumo <i>fictício</i>.</div>', 'abstract': 'Warm-up abstract.',
+}
+
+# Tempos (segundos) da importação do módulo e de cada etapa do aquecimento deste processo
+relatorio_inicializacao = {}
+
+def aquecer():
+    """
+    Renderiza um documento fictício de cada tipo (e a contracapa de cada nível e perfil) para que fontes,
+    estilos, logo reamostrado em cada perfil, geometria das faixas, modelos e templates Jinja fiquem residentes
+    antes do primeiro pedido. Pensado para os hooks do gunicorn (ver gunicorn.conf.py): com
+    preload_app roda uma vez no master e os workers herdam tudo pelo fork.
+    Não passa pelo cache de saída nem pelas métricas, e não cria pools/threads.
+    """
+    inicio = time.perf_counter()
+    app.jinja_env.get_template('formulario.html')
+    registro = RegistroTese.de_dados(limpar_dados(dict(DADOS_AQUECIMENTO)))
+    for filename, func, args in planejar_documentos(registro, list(CAMPOS_POR_DOCUMENTO)):
+        t = time.perf_counter()
+        func(registro, *args, io.BytesIO())
+        relatorio_inicializacao[f"aquecimento_{filename[:-4]}"] = time.perf_counter() - t
+    for nivel, perfil in itertools.product(CORES_FAIXAS, PERFIS_SAIDA):
+        gerar_contracapa(RegistroTese.de_dados({'nivel': nivel, 'perfil_saida': perfil}), io.BytesIO())
+    logo = recursos.obter('ipen_logo_azul.jpg')
+    try:
+        for perfil in PERFIS_SAIDA.values():
+            logo.xobjeto(LARGURA_LOGO_CAPA, perfil.dpi_imagens, perfil.qualidade_jpeg)
+    except Exception as e:
+        app.logger.warning(f"XObject do logo não preparado; a capa usará drawImage: {e}")
+    relatorio_inicializacao['aquecimento_total'] = time.perf_counter() - inicio
+    app.logger.info("Inicialização (pid %s): %s", os.getpid(), ", ".join(f"{fase}={segundos * 1000:.1f}ms" for fase, segundos in relatorio_inicializacao.items()))
+    return relatorio_inicializacao
+
+@app.cli.command('aquecer')
+def comando_aquecer():
+    """ Executa o aquecimento e imprime o relatório de tempos de inicialização. """
+    for fase, segundos in aquecer().items():
+        print(f"{fase:<28} {segundos * 1000:8.1f} ms")
+
+relatorio_inicializacao['importacao'] = time.perf_counter() - _INICIO_IMPORTACAO
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
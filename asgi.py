@@ -0,0 +1,156 @@
+"""
+Modo de serviço ASGI para o app Flask (WSGI).
+
+O corpo da requisição é recebido de forma assíncrona (um upload lento não prende thread) e
+a resposta é enviada em fluxo pelo event loop (um download lento também não). Só a execução
+do app (parse do formulário, renderização, próximo pedaço do ZIP) roda em um pool de threads
+limitado a ASGI_MAX_THREADS; com RENDER_EXECUTOR=process a renderização ainda sai para
+o pool de processos. As conexões ficam em keep-alive, gerenciadas pelo servidor ASGI.
+
+Uso:
+    uvicorn asgi:app --workers 2
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker    # reaproveita gunicorn.conf.py (pré-fork/aquecimento)
+"""
+import asyncio
+import concurrent.futures
+import sys
+import tempfile
+
+from app import app as aplicacao_wsgi, aquecer, relatorio_inicializacao
+
+# Cabeçalhos de conexão são do servidor ASGI, não do app (PEP 3333)
+CABECALHOS_SALTO = frozenset({'connection', 'keep-alive', 'proxy-connection', 'transfer-encoding', 'upgrade'})
+# Corpos até este tamanho ficam em memória; acima disso vão para um arquivo temporário
+CORPO_EM_MEMORIA = 1024 * 1024
+
+
+def montar_environ(scope, corpo):
+    """ Environ WSGI equivalente ao scope HTTP do ASGI. """
+    servidor = scope.get('server') or ('localhost', 80)
+    cliente = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': servidor[0],
+        'SERVER_PORT': str(servidor[1]),
+        'REMOTE_ADDR': cliente[0],
+        'REMOTE_PORT': str(cliente[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': corpo,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        # O corpo já foi lido inteiro (_ler_corpo): sem isso, um POST chunked chega vazio ao Werkzeug
+        'wsgi.input_terminated': True,
+    }
+    for nome, valor in scope.get('headers', []):
+        nome, valor = nome.decode('latin-1'), valor.decode('latin-1')
+        if nome == 'content-type':
+            chave = 'CONTENT_TYPE'
+        elif nome == 'content-length':
+            chave = 'CONTENT_LENGTH'
+        else:
+            chave = f"HTTP_{nome.upper().replace('-', '_')}"
+        environ[chave] = f"{environ[chave]},{valor}" if chave in environ else valor
+    return environ
+
+
+class AdaptadorASGI:
+    """ Executa um app WSGI sob um servidor ASGI, com o app rodando em um pool de threads limitado. """
+    def __init__(self, wsgi):
+        self.wsgi = wsgi
+        self._executor = None
+
+    @property
+    def executor(self):
+        # Criado no primeiro uso, já dentro do worker (depois do fork)
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.wsgi.config['ASGI_MAX_THREADS'], thread_name_prefix='asgi')
+        return self._executor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._ciclo_de_vida(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _ciclo_de_vida(self, receive, send):
+        while True:
+            mensagem = await receive()
+            if mensagem['type'] == 'lifespan.startup':
+                # Com gunicorn + preload o master já aqueceu; sob uvicorn puro, cada worker se aquece aqui
+                if 'aquecimento_total' not in relatorio_inicializacao:
+                    await asyncio.get_running_loop().run_in_executor(self.executor, aquecer)
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensagem['type'] == 'lifespan.shutdown':
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False, cancel_futures=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _ler_corpo(self, receive, limite):
+        """ Recebe o corpo inteiro sem ocupar thread; None se exceder o limite ou o cliente desconectar. """
+        corpo = tempfile.SpooledTemporaryFile(max_size=CORPO_EM_MEMORIA)
+        tamanho, mais = 0, True
+        while mais:
+            mensagem = await receive()
+            if mensagem['type'] == 'http.disconnect':
+                corpo.close()
+                return None
+            pedaco = mensagem.get('body', b'')
+            tamanho += len(pedaco)
+            if limite is not None and tamanho > limite:
+                corpo.close()
+                return None
+            corpo.write(pedaco)
+            mais = mensagem.get('more_body', False)
+        corpo.seek(0)
+        return corpo
+
+    async def _http(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        corpo = await self._ler_corpo(receive, self.wsgi.config.get('MAX_CONTENT_LENGTH'))
+        if corpo is None:
+            await send({'type': 'http.response.start', 'status': 413, 'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+            await send({'type': 'http.response.body', 'body': b'Request Entity Too Large'})
+            return
+
+        # Cliente que desconecta no meio do download interrompe o fluxo (e a renderização pendente)
+        desconectado = asyncio.Event()
+        async def vigiar_desconexao():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            desconectado.set()
+        vigia = asyncio.create_task(vigiar_desconexao())
+
+        inicio = {}
+        def start_response(status, headers, exc_info=None):
+            inicio['status'] = int(status.split(' ', 1)[0])
+            inicio['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers if k.lower() not in CABECALHOS_SALTO]
+            return lambda dados: None  # write() legado não é usado pelo Flask
+
+        resposta = None
+        try:
+            resposta = await loop.run_in_executor(self.executor, self.wsgi, montar_environ(scope, corpo), start_response)
+            pedacos = iter(resposta)
+            # O primeiro pedaço sai antes do cabeçalho: erros tardios do app ainda podem virar 500
+            pedaco = await loop.run_in_executor(self.executor, next, pedacos, None)
+            await send({'type': 'http.response.start', 'status': inicio['status'], 'headers': inicio['headers']})
+            while pedaco is not None and not desconectado.is_set():
+                if pedaco:
+                    await send({'type': 'http.response.body', 'body': pedaco, 'more_body': True})
+                pedaco = await loop.run_in_executor(self.executor, next, pedacos, None)
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            vigia.cancel()
+            if hasattr(resposta, 'close'):
+                await loop.run_in_executor(self.executor, resposta.close)
+            corpo.close()
+
+
+app = AdaptadorASGI(aplicacao_wsgi)
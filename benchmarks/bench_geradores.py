@@ -0,0 +1,171 @@
+"""
+Benchmark e verificação de regressão dos geradores de PDF e do POST completo em '/'.
+
+Mede, por documento: latência (p50/p95/p99), pico de memória (tracemalloc) e bytes
+gerados, sobre registros que cobrem os três níveis, os dois idiomas, resumos curtos e
+longos, com e sem coorientador. Todos os caches do app (saída, modelos, layout, prévias,
+imagens e sanitizador) são limpos antes de cada execução, para medir a renderização em si.
+
+Uso:
+    python benchmarks/bench_geradores.py                      # só mede
+    python benchmarks/bench_geradores.py --salvar-baseline    # grava a baseline desta máquina
+    python benchmarks/bench_geradores.py --comparar --repeticoes 50 --tolerancia 0.3
+
+A baseline depende da máquina e não é versionada: grave-a antes das mudanças e compare depois.
+Com --comparar, sai com código 1 se alguma métrica piorar além da tolerância e com código 2
+se a baseline não existir.
+"""
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+import app  # noqa: E402
+
+BASELINE_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_geradores.json')
+DOCUMENTOS = ['capa', 'pagina_rosto', 'ficha', 'contracapa', 'resumo', 'abstract']
+
+NIVEIS = ['Tese (Doutorado)', 'Dissertação (Mestrado)', 'Dissertação (Mestrado Profissional)']
+IDIOMAS = ['Português', 'Inglês']
+
+RESUMO_CURTO = "Estudo da <b>radiólise</b> de corantes por feixe de elétrons."
+RESUMO_LONGO = (
+    "Neste trabalho foi estudada a <b>radiólise</b> de soluções aquosas de <i>corantes azo</i> "
+    "por feixe de elétrons, com doses entre 1 e 20 kGy. Os resultados mostraram remoção de cor "
+    "superior a 90 % com dose de 5 kGy e redução de carbono orgânico total de 40 %. "
+) * 25
+
+BASE = {
+    'versao': 'Versão Corrigida', 'area': 'Aplicações em Tecnologia Nuclear', 'licenca': 'CC-BY-NC 4.0',
+    'nome_citacao': 'Silva Filho, Pedro F. da', 'nome_completo': 'Pedro Ferreira da', 'sobrenome': 'Silva Filho',
+    'ano': '2025', 'paginas': '123', 'bolsa': 'FAPESP 12/34567-8',
+    'titulo': 'Tratamento de efluentes têxteis por <i>feixe de elétrons</i>',
+    'subtitulo': 'avaliação da toxicidade', 'titulo_traduzido': 'Electron beam treatment of textile effluents',
+    'subtitulo_traduzido': 'toxicity assessment', 'orientador_tipo': 'Profa. Dra.', 'orientador': 'Isolda Costa',
+    'chave1': 'radiólise', 'chave2': 'corantes', 'chave3': 'feixe de elétrons',
+    'keyword1': 'radiolysis', 'keyword2': 'dyes', 'keyword3': 'electron beam',
+}
+
+def fixtures():
+    """ Um registro por combinação de nível, idioma, tamanho de resumo e coorientador. """
+    for nivel, idioma, longo, coorientador in itertools.product(NIVEIS, IDIOMAS, [False, True], [False, True]):
+        dados = dict(BASE, nivel=nivel, idioma=idioma)
+        dados['resumo'] = dados['abstract'] = RESUMO_LONGO if longo else RESUMO_CURTO
+        if coorientador:
+            dados.update(coorientador_tipo='Prof. Dr.', coorientador='Fulano de Tal')
+        nome = f"{app.categoria_nivel(nivel)}-{idioma[:2].lower()}-{'longo' if longo else 'curto'}-{'co' if coorientador else 'sem_co'}"
+        yield nome, app.limpar_dados(dados)
+
+def limpar_caches():
+    app.cache_saida.limpar()
+    app.cache_modelos.limpar()
+    app.cache_layout.limpar()
+    app.cache_previas.limpar()
+    app.recursos.limpar()
+    app._sanitizar_html.cache_clear()
+
+def percentis(amostras):
+    ordenadas = sorted(amostras)
+    def p(q): return ordenadas[min(len(ordenadas) - 1, int(round(q * (len(ordenadas) - 1))))]
+    return {'p50': p(0.50), 'p95': p(0.95), 'p99': p(0.99), 'media': statistics.fmean(ordenadas)}
+
+def medir(funcao, repeticoes):
+    """ Executa `funcao` repetidamente; retorna percentis de latência (ms), pico de memória (KiB) e bytes. """
+    tempos, tamanho = [], 0
+    for _ in range(repeticoes):
+        limpar_caches()
+        inicio = time.perf_counter()
+        tamanho = funcao()
+        tempos.append((time.perf_counter() - inicio) * 1e3)
+    limpar_caches()
+    tracemalloc.start()
+    funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return dict(percentis(tempos), pico_kib=pico / 1024, bytes=tamanho)
+
+def bench_documentos(repeticoes):
+    resultados = {}
+    registros = list(fixtures())
+    for documento in DOCUMENTOS:
+        for nome, dados in registros:
+            registro = app.RegistroTese.de_dados(dados)
+            (_, func, args), = app.planejar_documentos(registro, [documento])
+            def renderizar():
+                return len(app.renderizar_documento(func, registro, args))
+            resultados[f"{documento}/{nome}"] = medir(renderizar, repeticoes)
+    return resultados
+
+def bench_post(repeticoes):
+    # Todas as requisições saem do mesmo cliente: sem o limite por IP, e as fixtures não vão para o acervo
+    app.app.config['LIMITE_TAXA'] = 0
+    app.app.config['ACERVO_DB'] = ''
+    cliente = app.app.test_client()
+    resultados = {}
+    for nome, dados in list(fixtures())[::3]:
+        def enviar():
+            # Fechar a resposta libera a vaga do controle de admissão
+            with cliente.post('/', data=dict(dados, documentos=DOCUMENTOS)) as resposta:
+                assert resposta.status_code == 200 and resposta.mimetype == 'application/zip', resposta.status_code
+                return len(resposta.get_data())
+        resultados[f"POST/{nome}"] = medir(enviar, repeticoes)
+    return resultados
+
+def comparar(atual, baseline, tolerancia):
+    """ Lista as métricas que pioraram mais que `tolerancia` (fração) em relação à baseline. """
+    regressoes = []
+    for chave, metricas in atual.items():
+        referencia = baseline.get(chave)
+        if not referencia: continue
+        for metrica in ('p50', 'pico_kib', 'bytes'):
+            antes, agora = referencia.get(metrica), metricas[metrica]
+            if antes and agora > antes * (1 + tolerancia):
+                regressoes.append(f"{chave} {metrica}: {antes:.2f} -> {agora:.2f} (+{(agora / antes - 1) * 100:.0f}%)")
+    return regressoes
+
+def imprimir(resultados):
+    print(f"{'caso':<60}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'pico KiB':>10}{'bytes':>9}")
+    for chave, m in resultados.items():
+        print(f"{chave:<60}{m['p50']:>9.2f}{m['p95']:>9.2f}{m['p99']:>9.2f}{m['pico_kib']:>10.1f}{m['bytes']:>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeticoes', type=int, default=20)
+    parser.add_argument('--tolerancia', type=float, default=0.25, help="piora relativa aceita (0.25 = 25%%)")
+    parser.add_argument('--baseline', default=BASELINE_PADRAO)
+    parser.add_argument('--salvar-baseline', action='store_true')
+    parser.add_argument('--comparar', action='store_true', help="compara com a baseline (erro se ela não existir)")
+    parser.add_argument('--sem-post', action='store_true', help="mede apenas os geradores")
+    args = parser.parse_args()
+    if args.comparar and not os.path.exists(args.baseline):
+        parser.error(f"baseline {args.baseline} não encontrada (grave-a antes com --salvar-baseline)")
+
+    resultados = bench_documentos(args.repeticoes)
+    if not args.sem_post:
+        resultados.update(bench_post(args.repeticoes))
+    imprimir(resultados)
+
+    if args.salvar_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2, sort_keys=True)
+        print(f"\nBaseline gravada em {args.baseline}")
+        return 0
+    if not args.comparar:
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        regressoes = comparar(resultados, json.load(f), args.tolerancia)
+    if regressoes:
+        print(f"\n{len(regressoes)} regressão(ões) acima de {args.tolerancia:.0%}:")
+        for linha in regressoes: print(f"  {linha}")
+        return 1
+    print(f"\nSem regressões acima de {args.tolerancia:.0%} em relação à baseline.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
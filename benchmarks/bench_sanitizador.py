@@ -0,0 +1,54 @@
+"""
+Compara clean_html_for_reportlab (passada única + memo) com a implementação de
+referência em BeautifulSoup, usando resumos no formato que chega do formulário.
+
+Uso: python benchmarks/bench_sanitizador.py [repeticoes]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+
+# Resumo digitado no editor do formulário (contenteditable gera <div> e <font>)
+RESUMO_EDITOR = (
+    "<div>Neste trabalho foi estudada a <b>radiólise</b> de soluções aquosas de "
+    "<i>corantes azo</i> por feixe de elétrons, com doses entre 1 e 20 kGy.</div>"
+    "<div><br></div>"
+    "<div>Os resultados mostraram remoção de cor superior a 90&nbsp;% com dose de "
+    "5 kGy e redução de <font color=\"#ff0000\">carbono orgânico total</font> de 40 %. "
+    "A toxicidade aguda foi avaliada com <i>Vibrio fischeri</i> e <i>Daphnia similis</i>.</div>"
+) * 6
+
+# Resumo colado do Word: estilos mso, spans, comentários condicionais e <o:p>
+RESUMO_WORD = (
+    "<!--[if gte mso 9]><xml><w:WordDocument><w:View>Normal</w:View></w:WordDocument></xml><![endif]-->"
+    "<p class=\"MsoNormal\" style=\"text-align:justify;line-height:150%\">"
+    "<span style=\"font-size:12.0pt;line-height:150%;font-family:&quot;Arial&quot;,sans-serif\">"
+    "A dosimetria de feixes de fótons de alta energia foi realizada com dosímetros "
+    "termoluminescentes de LiF:Mg,Ti (TLD-100) e câmaras de ionização. "
+    "<b style=\"mso-bidi-font-weight:normal\">Os fatores de correção</b> obtidos "
+    "foram comparados com valores de referência (H<sub>2</sub>O, <sup>60</sup>Co).<o:p></o:p></span></p>\n"
+    "<p class=\"MsoNormal\"><span lang=\"EN-US\" style=\"mso-ansi-language:EN-US\">&nbsp;<o:p></o:p></span></p>\n"
+) * 6
+
+FIXTURES = {
+    'editor': RESUMO_EDITOR,
+    'word': RESUMO_WORD,
+    'palavra-chave': "<div>dosimetria</div>",
+}
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(f"{'entrada':<14}{'bytes':>8}{'bs4 (ms)':>12}{'novo (ms)':>12}{'memo (µs)':>12}{'ganho':>8}")
+    for nome, html in FIXTURES.items():
+        assert app.clean_html_for_reportlab(html) == app.clean_html_for_reportlab_bs4(html), nome
+        t_bs4 = timeit.timeit(lambda: app.clean_html_for_reportlab_bs4(html), number=repeticoes) / repeticoes
+        t_novo = timeit.timeit(lambda: (app._sanitizar_html.cache_clear(), app.clean_html_for_reportlab(html)), number=repeticoes) / repeticoes
+        app.clean_html_for_reportlab(html)
+        t_memo = timeit.timeit(lambda: app.clean_html_for_reportlab(html), number=repeticoes) / repeticoes
+        print(f"{nome:<14}{len(html):>8}{t_bs4 * 1e3:>12.3f}{t_novo * 1e3:>12.3f}{t_memo * 1e6:>12.2f}{t_bs4 / t_novo:>7.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Teste de carga do POST em '/' com clientes concorrentes, para comparar os modos de serviço.
+
+Cada cliente usa uma conexão HTTP/1.1 persistente (reaberta só se o servidor fechar) e envia
+o formulário completo, com o título variando a cada pedido para não cair no cache de saída.
+Clientes lentos opcionais leem a resposta a poucos KiB/s, como um download por rede ruim:
+no modo WSGI com workers sync cada um prende um worker inteiro; no ASGI, só o event loop.
+
+Uso:
+    python benchmarks/carga.py --url http://127.0.0.1:8000 --clientes 16 --duracao 20
+    python benchmarks/carga.py --comparar --workers 2 --lentos 4     # sobe gunicorn (sync) e uvicorn (asgi) e compara
+"""
+import argparse
+import http.client
+import itertools
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOCUMENTOS = ['capa', 'pagina_rosto', 'ficha', 'contracapa', 'resumo', 'abstract']
+
+FORMULARIO = {
+    'idioma': 'Português', 'versao': 'Versão Corrigida', 'nivel': 'Dissertação (Mestrado)', 'area': 'Aplicações em Tecnologia Nuclear',
+    'licenca': 'CC-BY-NC 4.0', 'nome_citacao': 'Silva, Ana', 'nome_completo': 'Ana', 'sobrenome': 'Silva', 'ano': '2025', 'paginas': '123',
+    'subtitulo': '', 'titulo_traduzido': 'Electron beam treatment', 'subtitulo_traduzido': '', 'orientador_tipo': 'Profa. Dra.',
+    'orientador': 'Isolda Costa', 'chave1': 'radiólise', 'chave2': 'corantes', 'chave3': 'feixe de elétrons',
+    'keyword1': 'radiolysis', 'keyword2': 'dyes', 'keyword3': 'electron beam',
+    'resumo': "Estudo da <b>radiólise</b> de corantes por feixe de elétrons. " * 20, 'abstract': "Electron beam radiolysis of dyes. " * 20,
+}
+
+# Comando de cada modo comparado; {porta} e {workers} são preenchidos na hora
+MODOS = {
+    'wsgi-sync': ["gunicorn", "app:app", "--bind", "127.0.0.1:{porta}", "--workers", "{workers}", "--worker-class", "sync"],
+    'asgi': ["uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", "{porta}", "--workers", "{workers}", "--no-access-log"],
+}
+
+def corpo_formulario(indice, documentos):
+    campos = dict(FORMULARIO, titulo=f"Tratamento de efluentes por feixe de elétrons {indice}")
+    return urllib.parse.urlencode(list(campos.items()) + [('documentos', d) for d in documentos]).encode('utf-8')
+
+class Cliente(threading.Thread):
+    """ Envia POSTs em sequência por uma conexão persistente até o fim do teste. """
+    def __init__(self, alvo, documentos, contador, fim, taxa_leitura=None):
+        super().__init__(daemon=True)
+        self.alvo, self.documentos, self.contador, self.fim = alvo, documentos, contador, fim
+        self.taxa_leitura = taxa_leitura  # bytes/s; None = o mais rápido possível
+        self.latencias, self.erros, self.conexoes = [], 0, 0
+
+    def _ler(self, resposta):
+        if self.taxa_leitura is None:
+            return resposta.read()
+        partes = []
+        while True:
+            parte = resposta.read(1024)
+            if not parte: return b''.join(partes)
+            partes.append(parte); time.sleep(1024 / self.taxa_leitura)
+
+    def run(self):
+        conexao = None
+        while time.monotonic() < self.fim:
+            if conexao is None:
+                conexao = http.client.HTTPConnection(self.alvo.hostname, self.alvo.port, timeout=120); self.conexoes += 1
+            inicio = time.perf_counter()
+            try:
+                conexao.request('POST', self.alvo.path or '/', corpo_formulario(next(self.contador), self.documentos), {'Content-Type': 'application/x-www-form-urlencoded'})
+                resposta = conexao.getresponse()
+                self._ler(resposta)
+                if resposta.status != 200: raise RuntimeError(resposta.status)
+                self.latencias.append(time.perf_counter() - inicio)
+                if resposta.will_close: conexao.close(); conexao = None
+            except Exception:
+                self.erros += 1
+                if conexao is not None: conexao.close()
+                conexao = None
+        if conexao is not None: conexao.close()
+
+def executar_carga(url, clientes, duracao, documentos, lentos=0, taxa_lenta=4096):
+    alvo = urllib.parse.urlsplit(url)
+    contador, fim = itertools.count(), time.monotonic() + duracao
+    rapidos = [Cliente(alvo, documentos, contador, fim) for _ in range(clientes)]
+    devagar = [Cliente(alvo, documentos, contador, fim, taxa_lenta) for _ in range(lentos)]
+    inicio = time.monotonic()
+    for c in rapidos + devagar: c.start()
+    for c in rapidos + devagar: c.join()
+    decorrido = time.monotonic() - inicio
+    latencias = sorted(l for c in rapidos for l in c.latencias)
+    def p(q): return latencias[min(len(latencias) - 1, int(q * (len(latencias) - 1)))] * 1e3 if latencias else float('nan')
+    return {
+        'requisicoes': len(latencias), 'req_s': len(latencias) / decorrido,
+        'p50_ms': p(0.50), 'p95_ms': p(0.95), 'p99_ms': p(0.99), 'media_ms': statistics.fmean(latencias) * 1e3 if latencias else float('nan'),
+        'erros': sum(c.erros for c in rapidos), 'conexoes': sum(c.conexoes for c in rapidos),
+    }
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0)); return s.getsockname()[1]
+
+def aguardar_servidor(porta, processo, limite=60):
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim:
+        if processo.poll() is not None: raise RuntimeError(f"Servidor terminou com código {processo.returncode}")
+        try:
+            conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=2); conexao.request('GET', '/'); conexao.getresponse().read(); conexao.close()
+            return
+        except OSError:
+            time.sleep(0.3)
+    raise RuntimeError("Servidor não respondeu a tempo")
+
+def comparar(args, documentos):
+    resultados = {}
+    for modo, comando in MODOS.items():
+        porta = porta_livre()
+        # Todos os clientes saem do mesmo IP: sem o limite por cliente, senão o teste mede só os 429
+        ambiente = dict(os.environ, LIMITE_TAXA='0')
+        processo = subprocess.Popen([parte.format(porta=porta, workers=args.workers) for parte in comando], cwd=RAIZ, env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            aguardar_servidor(porta, processo)
+            print(f"{modo}: {args.clientes} clientes + {args.lentos} lentos por {args.duracao}s...", flush=True)
+            resultados[modo] = executar_carga(f"http://127.0.0.1:{porta}/", args.clientes, args.duracao, documentos, args.lentos, args.taxa_lenta)
+        finally:
+            processo.terminate(); processo.wait(timeout=30)
+    return resultados
+
+def imprimir(resultados):
+    colunas = ['requisicoes', 'req_s', 'p50_ms', 'p95_ms', 'p99_ms', 'erros', 'conexoes']
+    print(f"\n{'modo':<12}" + "".join(f"{c:>13}" for c in colunas))
+    for modo, r in resultados.items():
+        print(f"{modo:<12}" + "".join(f"{r[c]:>13.1f}" if isinstance(r[c], float) else f"{r[c]:>13}" for c in colunas))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000/')
+    parser.add_argument('--comparar', action='store_true', help="sobe cada modo de MODOS localmente e compara")
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--clientes', type=int, default=16)
+    parser.add_argument('--lentos', type=int, default=0, help="clientes adicionais que baixam devagar")
+    parser.add_argument('--taxa-lenta', type=int, default=4096, help="bytes/s dos clientes lentos")
+    parser.add_argument('--duracao', type=float, default=20)
+    parser.add_argument('--documentos', default=','.join(DOCUMENTOS))
+    args = parser.parse_args()
+
+    documentos = [d for d in args.documentos.split(',') if d]
+    if args.comparar:
+        imprimir(comparar(args, documentos))
+    else:
+        imprimir({args.url: executar_carga(args.url, args.clientes, args.duracao, documentos, args.lentos, args.taxa_lenta)})
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Relatório de bytes por perfil de saída (PERFIS_SAIDA) e economia em relação ao perfil 'arquivo'.
+
+Renderiza cada documento, e o PDF único, com cada perfil sobre os mesmos registros do
+bench_geradores (três níveis, dois idiomas, resumos curtos e longos). Os tamanhos são
+somados por documento; a última linha estima o espaço ocupado por N trabalhos completos.
+
+Uso:
+    python benchmarks/perfis_saida.py
+    python benchmarks/perfis_saida.py --trabalhos 5000 --json perfis.json
+"""
+import argparse
+import dataclasses
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_geradores import DOCUMENTOS, app, fixtures, limpar_caches  # noqa: E402
+
+REFERENCIA = 'arquivo'
+
+def medir_perfis():
+    """ {documento: {perfil: {'bytes': total, 'ms': tempo total}}} sobre todas as fixtures. """
+    registros = [app.RegistroTese.de_dados(dados) for _, dados in fixtures()]
+    resultados = {documento: {} for documento in DOCUMENTOS + ['pdf_unico']}
+    for perfil in app.PERFIS_SAIDA:
+        limpar_caches()
+        totais = {documento: {'bytes': 0, 'ms': 0.0} for documento in resultados}
+        for base in registros:
+            registro = dataclasses.replace(base, perfil_saida=perfil)
+            for documento in DOCUMENTOS:
+                (_, func, args), = app.planejar_documentos(registro, [documento])
+                inicio = time.perf_counter()
+                totais[documento]['bytes'] += len(app.renderizar_documento(func, registro, args))
+                totais[documento]['ms'] += (time.perf_counter() - inicio) * 1e3
+            buffer, inicio = io.BytesIO(), time.perf_counter()
+            app.gerar_pdf_unico(registro, DOCUMENTOS, buffer)
+            totais['pdf_unico']['bytes'] += len(buffer.getvalue())
+            totais['pdf_unico']['ms'] += (time.perf_counter() - inicio) * 1e3
+        for documento, total in totais.items():
+            resultados[documento][perfil] = {'bytes': total['bytes'] / len(registros), 'ms': total['ms'] / len(registros)}
+    return resultados
+
+def imprimir(resultados, trabalhos):
+    perfis = list(app.PERFIS_SAIDA)
+    print(f"{'documento':<14}" + "".join(f"{p + ' B':>14}{'economia':>10}" for p in perfis) + "   (médias por registro)")
+    for documento, por_perfil in resultados.items():
+        referencia = por_perfil[REFERENCIA]['bytes']
+        print(f"{documento:<14}" + "".join(f"{por_perfil[p]['bytes']:>14.0f}{(1 - por_perfil[p]['bytes'] / referencia) * 100:>9.1f}%" for p in perfis))
+    por_trabalho = {p: sum(resultados[d][p]['bytes'] for d in DOCUMENTOS) for p in perfis}
+    print(f"\n{trabalhos} trabalhos com os {len(DOCUMENTOS)} documentos:")
+    for p in perfis:
+        total = por_trabalho[p] * trabalhos
+        print(f"  {p:<10} {total / 2**20:>9.1f} MiB  ({(1 - por_trabalho[p] / por_trabalho[REFERENCIA]) * 100:.1f}% a menos que '{REFERENCIA}')")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--trabalhos', type=int, default=1000, help="número de trabalhos para a estimativa de armazenamento")
+    parser.add_argument('--json', help="grava os resultados neste arquivo")
+    args = parser.parse_args()
+
+    resultados = medir_perfis()
+    imprimir(resultados, args.trabalhos)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2, sort_keys=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
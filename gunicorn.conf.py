@@ -0,0 +1,36 @@
+"""
+Configuração do gunicorn (lida automaticamente de ./gunicorn.conf.py).
+
+Com preload_app (padrão), o app é importado e aquecido uma única vez no master e os
+workers herdam fontes, estilos, logo reamostrado e modelos pelo fork; workers reciclados
+(max_requests) ou novos já nascem prontos. Com GUNICORN_PRELOAD=0, cada worker se aquece
+em post_fork, antes de aceitar conexões.
+
+Uso:
+    gunicorn app:app
+    GUNICORN_PRELOAD=0 WEB_CONCURRENCY=4 gunicorn app:app
+"""
+import os
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 0))
+
+
+def relatorio(tempos):
+    return ", ".join(f"{fase}={segundos * 1000:.1f}ms" for fase, segundos in tempos.items())
+
+
+def when_ready(server):
+    # No master: com preload_app o módulo já foi importado e aquecê-lo aqui beneficia todos os workers
+    if preload_app:
+        import app
+        server.log.info("Inicialização: %s", relatorio(app.aquecer()))
+
+
+def post_fork(server, worker):
+    # Sem preload, o worker importa o app aqui (o carregamento do WSGI reaproveita o módulo)
+    if not preload_app:
+        import app
+        server.log.info("Inicialização do worker %s: %s", worker.pid, relatorio(app.aquecer()))
@@ -0,0 +1,50 @@
+"""
+Teste diferencial: clean_html_for_reportlab (passada única) contra a implementação de
+referência em BeautifulSoup, em casos conhecidos e em fragmentos gerados aleatoriamente.
+
+Uso: python -m pytest tests
+"""
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+
+pytest.importorskip('bs4')
+
+# Pedaços que o editor do formulário, o Word e a digitação produzem, inclusive HTML malformado
+PEDACOS = [
+    '<p>', '</p>', '<div style="a">', '</div>', '<DIV>', '</DIV>', '<b>', '</b>', '<B>', '</B>', '<i>', '</i>', '<u>', '</u>',
+    '<br>', '<br/>', '<br />', '<hr>', '<img src=a>', '<P ALIGN=center>', '<sup>', '</sup>', '<sub>', '</sub>',
+    '<font>', '</font>', '<font color="red" face=\'Arial\' size=3 class=x>', '<font size=3 face=x color=red>',
+    '<font SIZE=1 Color="#f00">', '<font color=a color=b>', '<a>', '</a>', '<a href="http://x?a=1&b=2" target=_blank>',
+    '<a target=x href=y>', '<span style="mso-x">', '</span>', '<o:p>', '</o:p>', '<pre>', '</pre>', '<script>', '</script>',
+    'texto ', ' ', '  ', '\n', '\r\n', '\t', 'ação', 'x>y', '"q"', "'",
+    '&amp;', '&nbsp;', '&lt;', '&#233;', '&eacute;', '&unknown;', '&foo', '&amp', '&copy', '&AMP;', '& ', '&notit;',
+    '&#x41;', '&#65', '&#1234567;', '&#128;', '&#0;', '&#x;', '&#xD800;', '&#',
+    '<!-- c -->', '<!--[if gte mso 9]><xml>x</xml><![endif]-->', '<!--', '<!', '<?x',
+    '<b', '</b', '<font color=', '</', '<',
+]
+
+CASOS = {
+    'atributos em ordem alfabética': '<font color=red size=3 face=x>texto</font>',
+    'entidade desconhecida': 'a &unknown; b',
+    'entidade sem ponto e vírgula no fim': 'P&amp',
+    'tag não terminada': 'fim <b',
+    'br dentro de nome de tag': '<b<br>x',
+    'resumo do editor': '<div>Estudo da <b>radiólise</b>.</div><div><br></div><div>90&nbsp;% de <font color="#ff0000">remoção</font></div>',
+    'colado do Word': '<p class="MsoNormal"><span style="font-size:12.0pt">H<sub>2</sub>O<o:p></o:p></span></p>\n',
+}
+
+@pytest.mark.parametrize('html', CASOS.values(), ids=CASOS.keys())
+def test_casos_conhecidos(html):
+    assert app.clean_html_for_reportlab(html) == app.clean_html_for_reportlab_bs4(html)
+
+def test_fragmentos_aleatorios():
+    sorteio = random.Random(2024)
+    for _ in range(3000):
+        html = ''.join(sorteio.choice(PEDACOS) for _ in range(sorteio.randint(1, 25)))
+        assert app._sanitizar_html.__wrapped__(html) == app.clean_html_for_reportlab_bs4(html), html